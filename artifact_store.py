@@ -0,0 +1,250 @@
+""" Content addressed store of finished encodes.
+
+Job is identified by hash of its plugin and binaries (their content, not
+path), options and content of the input file. Files of finished jobs are
+copied into the store and an identical job of other setting or other
+campaign gets copies of them instead of encoding again. Stored objects never
+share inode with job's files, so later writes to the same output path (e.g.
+encode with other options) can't change them. Metric logs computed later
+next to any copy of the stored bitstream are picked up too.
+
+Layout of store:
+    objects/<key[:2]>/<key>/meta.json    components of the key
+    objects/<key[:2]>/<key>/owners       JSON lines with copies in campaigns
+    objects/<key[:2]>/<key>/encoded.ivf  encoded file and other artifacts
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import video_info
+
+
+STORE_VERSION = 1
+# Files next to job's basename which belong to its encode.
+LOG_SUFFIXES = ("_useage.log", "_useage_procs.log", ".report",
+                "-psnr_logfile.txt", "-ssim_logfile.txt", "-vmaf_logfile.txt")
+HASH_BLOCK = 1024 * 1024
+
+_digests = {}  # key is (realpath, size, mtime_ns)
+_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """ SHA-256 of file content.
+
+    Digest is kept for the file version (size and modification time) in
+    memory and in video_info probe cache, so big inputs are read once.
+
+    Returns: Hex digest string.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if key in _digests:
+            return _digests[key]
+    cache = video_info.cache
+    digest = None
+    if cache is not None:
+        try:
+            digest = cache.get(path, "sha256")
+        except KeyError:
+            pass
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(HASH_BLOCK):
+                sha.update(block)
+        digest = sha.hexdigest()
+        if cache is not None:
+            cache.put(path, "sha256", digest)
+    with _digests_lock:
+        _digests[key] = digest
+    return digest
+
+
+def binary_digest(binary):
+    """ Identity of binary, digest of its content or the name if not found. """
+    path = shutil.which(binary) or binary
+    if os.path.isfile(path):
+        return file_digest(path)
+    return binary
+
+
+def _copy(src, dst):
+    """ Copy src to dst with its modification time, replacing dst.
+
+    dst is replaced by rename, so other names of the old dst are untouched.
+    """
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _same_version(src, dst):
+    """ dst is copy of src made by _copy(). """
+    try:
+        a, b = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+class Artifact_store:
+    """ Store of encoded files and their logs, addressed by job content.
+
+    Store can be shared by campaigns and concurrent runs, entries are
+    published by atomic rename of their directory.
+
+    Attributes:
+        path: Directory of the store.
+
+    Other attributes:
+        linked: Number of jobs which got stored artifacts from this object.
+
+    class functions:
+        key(job): Hash of plugin, binaries, options and input of job.
+        fetch(job): Copy stored artifacts to job's paths, True if there were
+            any.
+        claim(job): Record that job started encoding its key.
+        is_claimed(job): True if identical job is encoding now.
+        release(job, finished): Job ended, publish its files if finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.claims = {}  # key: job which is encoding it
+        self.linked = 0
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+
+    def _components(self, job):
+        binaries = job.binary if isinstance(job.binary, (list, tuple)) else [job.binary]
+        return {
+            "version": STORE_VERSION,
+            "plugin": file_digest(job.transcode_set.transcode_plugin),
+            "binary": [binary_digest(str(b)) for b in binaries],
+            "args": [str(a).strip() for a in job.args],
+            "input": file_digest(job.inputfile),
+            "two_pass": bool(job.two_pass),
+            "measure_decode": bool(job.measure_decode),
+            "encoded_ext": os.path.splitext(job.encodedfile)[1],
+            "output_ext": os.path.splitext(job.outputfile)[1],
+        }
+
+    def key(self, job):
+        if getattr(job, "artifact_key", None) is None:
+            components = self._components(job)
+            job.artifact_components = components
+            job.artifact_key = hashlib.sha256(
+                json.dumps(components, sort_keys=True).encode()).hexdigest()
+        return job.artifact_key
+
+    def _dir(self, key):
+        return os.path.join(self.path, "objects", key[:2], key)
+
+    @staticmethod
+    def _files(job):
+        """ Paths of job's artifacts, key is name in the store. """
+        files = {"encoded" + os.path.splitext(job.encodedfile)[1]: job.encodedfile}
+        if job.outputfile != job.encodedfile:
+            files["output" + os.path.splitext(job.outputfile)[1]] = job.outputfile
+        for suffix in LOG_SUFFIXES:
+            files["artifact" + suffix] = job.basename + suffix
+        return files
+
+    def _owners(self, entry):
+        try:
+            with open(os.path.join(entry, "owners"), 'r') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _add_owner(self, entry, job):
+        with open(os.path.join(entry, "owners"), 'a') as f:
+            f.write(json.dumps({"basename": os.path.abspath(job.basename),
+                                "encodedfile": os.path.abspath(job.encodedfile)}) + "\n")
+
+    def _refresh(self, entry, stored):
+        """ Take logs made later next to copies, e.g. metric logs. """
+        try:
+            with open(os.path.join(entry, "meta.json"), 'r') as f:
+                encoded_digest = json.load(f)["encoded_sha256"]
+        except (OSError, KeyError, ValueError):
+            return
+        for owner in self._owners(entry):
+            missing = [s for s in LOG_SUFFIXES if "artifact" + s not in stored
+                       and os.path.isfile(owner["basename"] + s)]
+            if not missing:
+                continue
+            try:
+                # Owner's logs belong to the stored bitstream only while it
+                # isn't encoded again.
+                if file_digest(owner["encodedfile"]) != encoded_digest:
+                    continue
+            except OSError:
+                continue
+            for suffix in missing:
+                _copy(owner["basename"] + suffix, os.path.join(entry, "artifact" + suffix))
+                stored.add("artifact" + suffix)
+
+    def fetch(self, job):
+        entry = self._dir(self.key(job))
+        try:
+            stored = set(os.listdir(entry))
+        except FileNotFoundError:
+            return False
+        self._refresh(entry, stored)
+        for name, path in self._files(job).items():
+            if name not in stored:
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            src = os.path.join(entry, name)
+            if not _same_version(src, path):
+                _copy(src, path)
+        if os.path.abspath(job.basename) not in (o["basename"] for o in self._owners(entry)):
+            self._add_owner(entry, job)
+        with self.lock:
+            self.linked += 1
+        return True
+
+    def claim(self, job):
+        with self.lock:
+            self.claims.setdefault(self.key(job), job)
+
+    def is_claimed(self, job):
+        with self.lock:
+            owner = self.claims.get(self.key(job))
+        return owner is not None and owner is not job
+
+    def release(self, job, finished):
+        try:
+            if finished:
+                self._publish(job)
+        finally:
+            with self.lock:
+                if self.claims.get(self.key(job)) is job:
+                    del self.claims[self.key(job)]
+
+    def _publish(self, job):
+        entry = self._dir(self.key(job))
+        if os.path.isdir(entry) or not os.path.isfile(job.encodedfile):
+            return
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp)
+        try:
+            for name, path in self._files(job).items():
+                if os.path.isfile(path):
+                    _copy(path, os.path.join(tmp, name))
+            encoded = next(n for n in os.listdir(tmp) if n.startswith("encoded"))
+            meta = {**job.artifact_components,
+                    "encoded_sha256": file_digest(os.path.join(tmp, encoded))}
+            with open(os.path.join(tmp, "meta.json"), 'w') as f:
+                json.dump(meta, f, indent=1)
+            self._add_owner(tmp, job)
+            os.rename(tmp, entry)
+        except OSError:
+            # Published by concurrent run.
+            shutil.rmtree(tmp, ignore_errors=True)
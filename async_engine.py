@@ -0,0 +1,87 @@
+""" Run transcode jobs on one asyncio event loop.
+
+Plugins with transcode_start_async(job) coroutine are run on the event loop
+instead of holding one pool thread per job and other thread for progress
+pipe. Every job's stdout and progress pipe are multiplexed on one thread, so
+orchestration doesn't compete with measured encoders.
+
+For embedding in asyncio application use run_job() and progress():
+    task = asyncio.create_task(async_engine.run_job(job))
+    async for status in async_engine.progress(job):
+        print(status["progress_perc"])
+"""
+import os
+import asyncio
+import threading
+import encoders_comparison_tool as enc
+
+
+# States after which job's status doesn't change.
+ENDED_STATES = ("finished", "failed", "error")
+
+
+def is_supported(mod):
+    """ Test if the plugin can be run on event loop on this platform. """
+    return os.name == "posix" and hasattr(mod, "transcode_start_async")
+
+
+async def run_job(job):
+    """ Run job by plugin's transcode_start_async().
+
+    Returns: Same as transcode_start() of plugin.
+    """
+    try:
+        return await job.mod.transcode_start_async(job)
+    except Exception:
+        enc.transcode_status_update_callback(job, ["state", "failed"])
+        raise
+
+
+async def progress(job):
+    """ Asynchronous iterator of job status.
+
+    Yields copy of job.status after every change, ends when job is finished,
+    failed or in error state. Can be used from any event loop and for jobs run in threads.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def listener(changed_job, stat):
+        if changed_job is job:
+            loop.call_soon_threadsafe(queue.put_nowait, dict(job.status))
+
+    enc.status_bus.subscribe(listener)
+    try:
+        if job.finished or job.status["state"] in ENDED_STATES:
+            yield dict(job.status)
+            return
+        while True:
+            status = await queue.get()
+            yield status
+            if status["state"] in ENDED_STATES:
+                break
+    finally:
+        enc.status_bus.unsubscribe(listener)
+
+
+class Async_engine:
+    """ Event loop running in its own thread.
+
+    class functions:
+        submit(job): Run job on event loop. Returns concurrent.futures.Future.
+        close(): Stop the event loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="async_engine", daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        return asyncio.run_coroutine_threadsafe(run_job(job), self.loop)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
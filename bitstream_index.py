@@ -0,0 +1,157 @@
+""" Packet sizes of video stream without decoding or remuxing.
+
+IVF and Matroska/WebM files are scanned natively, only the container
+headers are read and frame payloads are skipped. Other containers and raw
+Annex-B streams fall back to ffprobe packet listing, which demuxes the file
+but doesn't write anything.
+"""
+import mmap
+import struct
+import subprocess
+import numpy as np
+
+
+IVF_MAGIC = b"DKIF"
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+
+# Matroska element IDs
+_SEGMENT = 0x18538067
+_CLUSTER = 0x1F43B675
+_BLOCK_GROUP = 0xA0
+_BLOCK = 0xA1
+_SIMPLE_BLOCK = 0xA3
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_NUMBER = 0xD7
+_TRACK_TYPE = 0x83
+# Master elements which are descended into, all others are skipped.
+_MASTERS = {_SEGMENT, _CLUSTER, _BLOCK_GROUP, _TRACKS, _TRACK_ENTRY}
+_TRACK_TYPE_VIDEO = 1
+
+
+def _read_vint(buf, pos, keep_marker=False):
+    """ Read EBML variable length integer.
+
+    Returns: Tuple (value, length), value is None for unknown size.
+    """
+    first = buf[pos]
+    if first == 0:
+        raise ValueError(f"Invalid EBML variable length integer at {pos}")
+    length = 9 - first.bit_length()
+    value = int.from_bytes(buf[pos:pos + length], "big")
+    if keep_marker:
+        return value, length
+    value &= (1 << (7 * length)) - 1
+    if value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def matroska_packet_sizes(buf):
+    """ Sizes of frames of first video track in Matroska/WebM file.
+
+    Laced blocks are counted as one packet.
+
+    Args:
+        buf: Content of file as bytes-like object (e.g. mmap).
+
+    Returns: NumPy array with size of every packet in bytes.
+    """
+    tracks = {}  # track number: track type
+    entry = None
+    blocks = []  # (track number, payload size)
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        element_id, id_len = _read_vint(buf, pos, keep_marker=True)
+        size, size_len = _read_vint(buf, pos + id_len)
+        pos += id_len + size_len
+        if element_id in _MASTERS:
+            if element_id == _TRACK_ENTRY:
+                entry = {}
+            continue  # children follow, unknown size is fine
+        if size is None:
+            raise ValueError(f"Unknown size of element {element_id:x}")
+        if element_id in (_SIMPLE_BLOCK, _BLOCK):
+            track, track_len = _read_vint(buf, pos)
+            # track number, 16 bit timecode and flags
+            blocks.append((track, size - track_len - 3))
+        elif element_id in (_TRACK_NUMBER, _TRACK_TYPE) and entry is not None:
+            entry[element_id] = int.from_bytes(buf[pos:pos + size], "big")
+            if _TRACK_NUMBER in entry and _TRACK_TYPE in entry:
+                tracks[entry[_TRACK_NUMBER]] = entry[_TRACK_TYPE]
+                entry = None
+        pos += size
+    video_tracks = sorted(t for t, kind in tracks.items() if kind == _TRACK_TYPE_VIDEO)
+    if not video_tracks:
+        raise ValueError("No video track in Matroska file")
+    track = video_tracks[0]
+    return np.fromiter((s for t, s in blocks if t == track), dtype=np.int64)
+
+
+def ivf_packet_sizes(buf):
+    """ Sizes of frames in IVF file.
+
+    Args:
+        buf: Content of file as bytes-like object (e.g. mmap).
+
+    Returns: NumPy array with size of every packet in bytes.
+    """
+    if buf[:4] != IVF_MAGIC:
+        raise ValueError("Not IVF file")
+    pos = struct.unpack_from("<H", buf, 6)[0]
+    sizes = []
+    end = len(buf)
+    while pos + 12 <= end:
+        size = struct.unpack_from("<I", buf, pos)[0]
+        sizes.append(size)
+        pos += 12 + size
+    return np.array(sizes, dtype=np.int64)
+
+
+def ffprobe_packet_sizes(videofile_path, ffprobepath):
+    """ Sizes of packets of first video stream listed by ffprobe.
+
+    Returns: NumPy array with size of every packet in bytes.
+    """
+    result = subprocess.run(
+        [
+            ffprobepath,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=size",
+            "-of",
+            "csv=p=0",
+            videofile_path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise ValueError(result.stderr.rstrip("\n"))
+    return np.array([int(s) for s in result.stdout.split()], dtype=np.int64)
+
+
+def packet_sizes(videofile_path, ffprobepath="ffprobe"):
+    """ Sizes of packets of video stream in file order.
+
+    Args:
+        videofile_path: Path to video file.
+        ffprobepath: Path to ffprobe for containers without native scanner.
+
+    Returns: NumPy array with size of every packet in bytes.
+    """
+    with open(videofile_path, "rb") as f:
+        magic = f.read(4)
+        if magic in (IVF_MAGIC, EBML_MAGIC):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                try:
+                    if magic == IVF_MAGIC:
+                        return ivf_packet_sizes(buf)
+                    return matroska_packet_sizes(buf)
+                except (ValueError, IndexError, struct.error):
+                    pass  # damaged or unusual file, let ffmpeg handle it
+    return ffprobe_packet_sizes(videofile_path, ffprobepath)
@@ -0,0 +1,267 @@
+""" Distributed execution of transcode jobs on multiple nodes.
+
+Coordinator makes job queue from Transcode_setting() rows and input files.
+Worker agents on encode nodes connect to it, pull jobs, run them by the
+transcode plugin and send back the results and useage logs. Encoded files
+are written by workers to output_path, so it should be shared storage (NFS)
+or mounted on the same path. The useage logs (also per process) and reports
+of the job are copied back always.
+
+Usage on one machine with local socket:
+    coordinator (e.g. in main.py):
+        distributed.Coordinator(binaries, inputfiles_list, transcode_set,
+                                outputpath, "/tmp/ect.sock", b"secret").serve()
+    workers:
+        python distributed.py --address /tmp/ect.sock --authkey secret
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import collections
+from multiprocessing.connection import Listener, Client
+import encoders_comparison_tool as enc
+import video_info
+
+
+def parse_address(address):
+    """ Make address for multiprocessing.connection from string.
+
+    "host:port" is TCP socket, anything else is path of unix socket.
+    """
+    if isinstance(address, tuple):
+        return address
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return address
+
+
+class Coordinator:
+    """ Serve transcode jobs to Worker_agent objects.
+
+    Attributes:
+        binaries_ent: Dictionary with binaries and their path.
+        videofiles: Iterable containing path to video files.
+        transcode_sets: Dictionary of Transcode_setting objects.
+        output_path: Path to folder where transcoded videos will be outputed.
+        address: "host:port" or path to unix socket.
+        authkey: Bytes, shared secret of coordinator and workers.
+        kwargs: Passed to Transcode_job on workers.
+
+    class functions:
+        serve(): Serve jobs until all of them ends. Returns list of results.
+    """
+
+    def __init__(self, binaries_ent, videofiles, transcode_sets, output_path, address, authkey, **kwargs):
+        self.binaries_ent = binaries_ent
+        self.output_path = output_path
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.kwargs = kwargs
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.queue = collections.deque()
+        for name, transcode_set in transcode_sets.items():
+            for videofile in videofiles:
+                for args in transcode_set.grid():
+                    self.queue.append({"job_id": len(self.queue),
+                                       "setting": name,
+                                       "transcode_set": transcode_set,
+                                       "args": [str(a) for a in args],
+                                       "inputfile": videofile})
+        self.unfinished = len(self.queue)
+        self.results = []
+
+    def _next_job(self):
+        with self.lock:
+            if self.queue:
+                return self.queue.popleft()
+            return None
+
+    def _log_path(self, relpath):
+        """ Path of log sent by worker, None if it isn't inside output_path. """
+        root = os.path.abspath(self.output_path)
+        logfile = os.path.normpath(os.path.join(root, relpath))
+        if os.path.isabs(relpath) or os.path.commonpath([root, logfile]) != root:
+            return None
+        return logfile
+
+    def _store_result(self, spec, result):
+        for relpath, content in result["logs"].items():
+            logfile = self._log_path(relpath)
+            if logfile is None:
+                print(f"{enc.bcolors.WARNING}Rejected log {relpath} of job {spec['job_id']} outside of output path{enc.bcolors.ENDC}")
+                continue
+            enc.create_dir(os.path.dirname(logfile) or ".")
+            existing = None
+            if os.path.isfile(logfile):
+                with open(logfile, 'r', errors="replace") as log:
+                    existing = log.read()
+            if existing != content:  # not on shared storage
+                with open(logfile, 'w') as log:
+                    log.write(content)
+        with self.lock:
+            self.results.append({**spec, **result})
+            self.unfinished -= 1
+            self.done.notify_all()
+        print(f"job {spec['job_id']} on {result['worker']} ended with returncode: {result['returncode']}, error: {result['error']}")
+
+    def _handle(self, conn):
+        spec = None
+        try:
+            while True:
+                msg = conn.recv()
+                if msg[0] == "get":
+                    spec = self._next_job()
+                    conn.send(spec and {**spec,
+                                        "output_path": self.output_path,
+                                        "kwargs": self.kwargs})
+                    if spec is None:
+                        break
+                elif msg[0] == "result":
+                    self._store_result(spec, msg[1])
+                    spec = None
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if spec is not None:
+                # Worker disconnected in the middle of job, run it elsewhere.
+                print(f"{enc.bcolors.WARNING}Requeueing job {spec['job_id']}{enc.bcolors.ENDC}")
+                with self.lock:
+                    self.queue.appendleft(spec)
+                    self.done.notify_all()
+
+    def _accept(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                break  # listener closed
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def serve(self):
+        """ Serve jobs until all of them ends.
+
+        Returns: List of dictionaries with job specification and result.
+        """
+        video_info.set_defaults(self.binaries_ent)
+        listener = Listener(self.address, authkey=self.authkey)
+        print(f"Coordinator listening on {listener.address} with {self.unfinished} jobs.")
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        with self.lock:
+            while self.unfinished > 0:
+                self.done.wait()
+        listener.close()
+        return self.results
+
+
+class Worker_agent:
+    """ Pull jobs from Coordinator and run them by the transcode plugin.
+
+    Attributes:
+        address: "host:port" or path to unix socket of coordinator.
+        authkey: Bytes, shared secret of coordinator and workers.
+        binaries_ent: Dictionary with binaries and their path on this node.
+        slots: Number of concurrently running jobs on this node.
+        output_path: Optional, where output_path of coordinator is mounted.
+
+    class functions:
+        run(): Run jobs until coordinator has none.
+    """
+
+    def __init__(self, address, authkey, binaries_ent, slots=1, output_path=None):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.binaries_ent = binaries_ent
+        self.slots = slots
+        self.output_path = output_path
+        self.name = f"{os.uname().nodename}:{os.getpid()}"
+        self.mods = {}
+        self.lock = threading.Lock()
+
+    def _load_plugin(self, transcode_plugin):
+        with self.lock:
+            if transcode_plugin not in self.mods:
+                self.mods[transcode_plugin] = enc.load_plugin(transcode_plugin)
+            return self.mods[transcode_plugin]
+
+    def _run_job(self, spec):
+        output_path = self.output_path or spec["output_path"]
+        mod = self._load_plugin(spec["transcode_set"].transcode_plugin)
+        kwargs = {**spec["kwargs"], "append_useage_log": False}
+        result = {"worker": self.name, "returncode": None, "error": None,
+                  "useage_logfile": None, "useage_log": None, "logs": {}}
+        try:
+            enc.create_dir(output_path)
+            job = enc.Transcode_job(spec["transcode_set"], spec["job_id"], mod,
+                                    spec["args"], spec["inputfile"], output_path,
+                                    self.binaries_ent, **kwargs)
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+        enc.job_list.append(job)
+        try:
+            result["returncode"] = mod.transcode_start(job)[1]
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            enc.job_list.remove(job)
+        enc.useage_logger.flush()
+        # Logs needed by generate_plots, key is path relative to output_path.
+        for logfile in (job.useage_logfile, job.useage_procs_logfile, job.report,
+                        job.basename + "_first_pass.report", job.basename + "_decode.report"):
+            if os.path.isfile(logfile):
+                with open(logfile, 'r', errors="replace") as log:
+                    result["logs"][os.path.relpath(logfile, output_path)] = log.read()
+        result["useage_logfile"] = os.path.relpath(job.useage_logfile, output_path)
+        result["useage_log"] = result["logs"].get(result["useage_logfile"])
+        return result
+
+    def _slot(self):
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+        except OSError as e:
+            print(f"{enc.bcolors.WARNING}Cannot connect to coordinator {self.address}: {e}{enc.bcolors.ENDC}")
+            return
+        try:
+            while True:
+                conn.send(("get",))
+                spec = conn.recv()
+                if spec is None:
+                    break
+                conn.send(("result", self._run_job(spec)))
+        finally:
+            conn.close()
+
+    def run(self):
+        """ Run jobs until coordinator has none. """
+        video_info.set_defaults(self.binaries_ent)
+        monitor = enc.start_monitor()
+        threads = [threading.Thread(target=self._slot, name=f"slot{i}")
+                   for i in range(self.slots)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        for thread in threads:
+            thread.join()
+        enc.stop_monitor(monitor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker agent for distributed transcoding.")
+    parser.add_argument("--address", required=True, help="host:port or path to unix socket of coordinator")
+    parser.add_argument("--authkey", required=True, help="shared secret of coordinator and workers")
+    parser.add_argument("--slots", type=int, default=1, help="number of concurrent jobs")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="path to ffmpeg")
+    parser.add_argument("--ffprobe", default="ffprobe", help="path to ffprobe")
+    parser.add_argument("--output-path", help="where output path of coordinator is mounted")
+    args = parser.parse_args(argv)
+    binaries = {"ffmpeg": args.ffmpeg, "ffprobe": args.ffprobe}
+    Worker_agent(args.address, args.authkey.encode(), binaries, args.slots, args.output_path).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,43 @@
 import os
+import sys
+import json
+import math
 import time
+import shutil
 import threading
+import collections
 import concurrent.futures as cf
 from importlib import util
 import pathlib
 import numpy as np
 import psutil
 import video_info
+import async_engine
+from job_ledger import Job_ledger
+from artifact_store import Artifact_store
+from input_stager import Input_stager
 
 
 MONITOR_PROC_SECS = 0.1
+# How often are buffered useage samples written to useage logs.
+USEAGE_LOG_FLUSH_SECS = 2
+# How often Status_renderer prints status of jobs.
+STATUS_RENDER_SECS = 1
+# How often the Job_scheduler checks if a next job can be started.
+SCHEDULER_POLL_SECS = 0.5
+# Newly started job is not yet visible in measured useage, so for this time
+# its resources are reserved by estimate.
+SCHEDULER_SETTLE_SECS = 5
+# Number of next input sequences staged while others are encoding.
+STAGING_LOOKAHEAD = 2
+# Number of jobs created ahead of the running ones, at least 2 * max_workers.
+JOB_LOOKAHEAD = 32
+# Progress of a job is published at most this often, unless its
+# Transcode_job has progress_interval.
+PROGRESS_PUBLISH_SECS = 0.25
+# Estimates for jobs of Transcode_setting without any finished job.
+DEFAULT_JOB_MEM = 512 * 1024 * 1024  # bytes
+DEFAULT_JOB_CPU = 1.0  # logical processors
 
 
 # Colors in terminal
@@ -30,7 +58,7 @@ class bcolors:
 ###########################################################
 
 
-# Index corresponds to job_id.
+# Jobs which are queued or running, others are not kept in memory.
 job_list = []
 
 
@@ -45,9 +73,20 @@ class Transcode_setting(object):
             values: -1 - number of processors
                     n > 0  - number of concurrent jobs for this setting
                     none - by default no paralelism
+            Jobs are started only when measured CPU and free RAM allow it,
+            so this is the upper limit.
+        mem_estimate: Optional, RAM needed by one job in bytes. By default it
+            is measured from finished jobs of this setting.
+        cpu_estimate: Optional, number of logical processors used by one job.
+            By default it is measured from finished jobs of this setting.
+        threads: Optional, number of logical processors reserved for one job
+            when jobs are pinned to cores. By default one physical core.
+        videofiles: Optional, list of input files to which the setting is
+            applied. By default all input files of transcode_batch().
 
     class functions:
         self(): Make an 2D Numpy array with arguments for transcode.
+        grid(): Make lazy Sweep_grid of the arguments, for large sweeps.
         options_flat(): Make an numpy array (1D) with arguments and settings.
         param_find(): Find an sweep_param in options and return where is it in
             options_flat() and what is proceeding it.
@@ -62,41 +101,26 @@ class Transcode_setting(object):
         self.kwargs = kwargs
         self.concurrent = kwargs.get("concurrent")
         self.two_pass = kwargs.get("two_pass")
+        self.mem_estimate = kwargs.get("mem_estimate")
+        self.cpu_estimate = kwargs.get("cpu_estimate")
+        self.threads = kwargs.get("threads")
+        self.videofiles = kwargs.get("videofiles")
 
     def __call__(self):
         """ Make an 2D Numpy array with arguments for transcode.
 
-        Returns: Combination of every sweep_param values.
+        Returns: Combination of every sweep_param values, 1D array if there is
+            no sweep_param.
         """
-        args = np.array([])
-        for x in self.options:
-            for y in x:
-                if type(y) is str:  # self.options[x][y] is only string
-                    if args.ndim != 2:  # the args is 1D array
-                        args = np.append(args, y)
-                    else:  # else is 2D array
-                        args = np.c_[args, np.tile(y, (args.shape[0], 1))]
-                elif isinstance(y, sweep_param):
-                    if args.ndim == 2:  # if there is more than one sweep
-                        # parameter repeat every row by number of elements on
-                        # actual sweep parameter
-                        args = np.repeat(args, np.size(y()), axis=0)
-                        # add vector (repeated by number of actual size of args
-                        # matrix)
-                        args = np.c_[args,
-                                     np.tile(y(),
-                                             (1,
-                                              int(args.shape[0] /
-                                                  np.size(y())))).transpose()]
-                    elif args.ndim == 1:  # if this is first sweep
-                        args = np.tile(args, (np.size(y()), 1))
-                        args = np.c_[args, y().transpose()]
-                    else:
-                        raise Exception("Impossible error in args.ndim.")
-                else:
-                    raise ValueError(
-                        "Options can only be strings or sweep parameters.")
-        return args
+        return self.grid().array()
+
+    def grid(self, edge=False):
+        """ Make lazy Sweep_grid with combinations of sweep_param values.
+
+        Args:
+            edge: Use only edge values of sweeps like edge_cases().
+        """
+        return Sweep_grid(self.options_flat(), edge=edge)
 
     def options_flat(self):
         """ Make an numpy array (1D) with arguments and settings.
@@ -136,35 +160,7 @@ class Transcode_setting(object):
 
         Returns: Combination of sweep_param edge values.
         """
-        args = np.array([])
-        for x in self.options:
-            for y in x:
-                if type(y) is str:  # self.options[x][y] is only string
-                    if args.ndim != 2:  # the args is 1D array
-                        args = np.append(args, y)
-                    else:  # else is 2D array
-                        args = np.c_[args, np.tile(y, (args.shape[0], 1))]
-                elif isinstance(y, sweep_param):
-                    if args.ndim == 2:  # if there is more than one sweep
-                        # parameter repeat every row by number of elements on
-                        # actual sweep parameter
-                        args = np.repeat(args, np.size(y.edge()), axis=0)
-                        # add vector (repeated by number of actual size of args
-                        # matrix)
-                        args = np.c_[args,
-                                     np.tile(y.edge(), (
-                                         1,
-                                         int(args.shape[0] /
-                                             np.size(y.edge())))).transpose()]
-                    elif args.ndim == 1:  # if this is first sweep
-                        args = np.tile(args, (np.size(y.edge()), 1))
-                        args = np.c_[args, y.edge().transpose()]
-                    else:
-                        raise Exception("Impossible error in args.ndim.")
-                else:
-                    raise ValueError(
-                        "Options can only be strings or sweep parameters.")
-        return args
+        return self.grid(edge=True).array()
 
     def is_pos_param(self, pos: int) -> bool:
         """ Tests if sweep_param is at pos, if not raises ValueError. """
@@ -220,10 +216,88 @@ class sweep_param(object):
 
     def edge(self):
         """ Make reduced sweep to only edge values, if not 'list'. """
+        values = self()
         if self.mode == "list":
-            return self()
+            return values
         else:
-            return self()[0], self()[-1]
+            return values[0], values[-1]
+
+
+class Sweep_grid(object):
+    """ Lazy Cartesian product of sweep_param values.
+
+    Values of every sweep_param are computed once, rows are made only when
+    they are accessed. Order of rows is same as of Transcode_setting(), the
+    last sweep_param changes fastest.
+
+    Attributes:
+        options: Flat list of strings and sweep_param objects, see
+            Transcode_setting.options_flat().
+        edge: Use only edge values of sweeps.
+
+    class functions:
+        len(grid): Number of rows.
+        grid[i]: Row i as 1D Numpy array, negative index counts from end.
+        iter(grid): Iterate rows, they are made in vectorised blocks.
+        rows(start, stop): 2D Numpy array with rows from start to stop.
+        array(): All rows, 1D array if there is no sweep_param.
+    """
+
+    # Rows made at once by iteration.
+    BLOCK_ROWS = 4096
+
+    def __init__(self, options, edge=False):
+        self.columns = []
+        self.sweep_columns = []
+        width = 1
+        for option in options:
+            if isinstance(option, sweep_param):
+                values = option.edge() if edge else option()
+                values = np.asarray(values).astype(str).reshape(-1)
+                self.sweep_columns.append(len(self.columns))
+            elif type(option) is str:
+                values = np.array(option)
+            else:
+                raise ValueError(
+                    "Options can only be strings or sweep parameters.")
+            if values.size:
+                width = max(width, max(len(v) for v in values.reshape(-1)))
+            self.columns.append(values)
+        self.shape = tuple(self.columns[c].size for c in self.sweep_columns)
+        self.dtype = np.dtype(f"<U{width}")
+        self.length = math.prod(self.shape)
+
+    def __len__(self):
+        return self.length
+
+    def rows(self, start=0, stop=None):
+        """ Make 2D Numpy array with rows from start to stop. """
+        stop = self.length if stop is None else min(stop, self.length)
+        start = min(start, stop)
+        out = np.empty((stop - start, len(self.columns)), dtype=self.dtype)
+        indexes = np.unravel_index(np.arange(start, stop), self.shape) if self.shape else ()
+        for c, values in enumerate(self.columns):
+            if c not in self.sweep_columns:
+                out[:, c] = values
+        for c, index in zip(self.sweep_columns, indexes):
+            out[:, c] = self.columns[c][index]
+        return out
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(f"row {i} out of range of {self.length} rows")
+        return self.rows(i, i + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, self.length, self.BLOCK_ROWS):
+            yield from self.rows(start, start + self.BLOCK_ROWS)
+
+    def array(self):
+        if not self.sweep_columns:
+            return np.array(self.columns, dtype=self.dtype)
+        return self.rows()
 
 
 def sweep(mode, start, stop, n, prefix, suffix):
@@ -274,6 +348,10 @@ def count(n=0):
         n += 1
 
 
+# Unique job_id of Transcode_job in this process.
+job_ids = count()
+
+
 def strip_forbidden_chars(string):
     for ch in ['\\', '/', '|', '*', '"', '?', ':', '<', '>']:
         # erase forbidden characters in file names
@@ -288,43 +366,6 @@ def create_dir(path):
         p.mkdir(parents=True, exist_ok=True)
 
 
-# TODO
-# unused for now
-class inputfile_variants(object):
-    def __init__(self):
-        self.variants = []
-        self.inputfiles_variants = {}
-        self.variants_used = {}
-        self.lock = threading.Lock()
-
-    def request_variant(self, inputfile, file_format, pix_format="", jobid=None):
-        self.lock.acquire()
-        filebasename = os.path.splitext(os.path.basename(inputfile))[0]
-        outputfile = filebasename + "_" + pix_format + "." + file_format
-        if outputfile in self.variants:
-            self.variants_used["outputfile"] = self.variants_used["outputfile"] + 1
-            if file_format == "yuv":
-                return outputfile, video_info.video_get_info_for_yuv()
-            else:
-                return outputfile
-
-        spec = util.spec_from_file_location("mod", "ffmpeg_transcode.py")
-        mod = util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        if file_format == "yuv":
-            pass
-        self.lock.release()
-        return outputfile
-
-    def free_variant(self, variant_path):
-        self.lock.acquire()
-        self.lock.release()
-
-    def clean_variants(self):
-        self.lock.acquire()
-        self.lock.release()
-
-
 class Transcode_job:
     def __init__(self, transcode_set, job_id, mod, args, inputfile, outputfolder, binaries, **kwargs):
         self.transcode_set = transcode_set
@@ -371,6 +412,7 @@ class Transcode_job:
             self.two_pass = False
         self.binaries = binaries
         self.finished = False
+        self.frames_total = None  # frame count of input, see Progress_publisher
         self.status = {
             'frame': '0',
             'fps': '0.00',
@@ -382,14 +424,52 @@ class Transcode_job:
             'state': 'waiting'  # for indicating two-pass and other processing
         }
         self._PID = None
+        self._PIDs = []
+        self.cpus = None  # logical processors assigned by Core_allocator
+        self.process_tree = None
         self.cpu_useage = None
+        self.cpu_useage_sum = 0
+        self.useage_samples = 0
         self.mem_useage = None
+        self.max_mem_useage = 0
         self.bias_time = 0
         self.useage_logfile = self.basename + "_useage.log"
+        self.useage_procs_logfile = self.basename + "_useage_procs.log"
         self.report = self.basename + ".report"  # verbose log or stdout record
-        if not self.append_useage_log:
+        self.ledger = kwargs.get("ledger")
+        # Decoding is measured again, only encodes are shared.
+        self.artifacts = None if self.only_decode else kwargs.get("artifacts")
+        self.artifact_key = None
+        self.linked = False
+        if self.ledger is not None and self.ledger.is_finished(self):
+            # Finished in previous run, keep its useage log.
+            self.finished = True
+            self.status['state'] = 'finished'
+            return
+        if self.artifacts is not None and self.artifacts.fetch(self):
+            # Identical job was encoded by other setting or campaign.
+            self.finished = True
+            self.linked = True
+            self.status['state'] = 'finished'
+            if self.ledger is not None:
+                self.ledger.queued(self)
+                self.ledger.ended(self, returncode=0)
+            return
+        if self.ledger is not None:
+            self.ledger.queued(self)
+        if not self.append_useage_log or not os.path.isfile(self.useage_logfile):
             with open(self.useage_logfile, 'w') as logfile:
-                logfile.write("time,bias_time,state,cpu_time_user,cpu_time_system,cpu_time_children_user,cpu_time_children_system,cpu_time_iowait,cpu_percent,RSS,VMS\n")
+                logfile.write("time,bias_time,state,cpu_time_user,cpu_time_system,cpu_time_children_user,cpu_time_children_system,cpu_time_iowait,cpu_percent,RSS,VMS,cpus\n")
+            with open(self.useage_procs_logfile, 'w') as logfile:
+                logfile.write("time,state,pid,name,cpu_time_user,cpu_time_system,cpu_percent,RSS\n")
+            self.useage_log_cpus = True
+        else:
+            # Logs made by older versions have no cpus column.
+            with open(self.useage_logfile, 'r') as logfile:
+                self.useage_log_cpus = next(logfile, "").rstrip("\n").endswith(",cpus")
+            if not os.path.isfile(self.useage_procs_logfile):
+                with open(self.useage_procs_logfile, 'w') as logfile:
+                    logfile.write("time,state,pid,name,cpu_time_user,cpu_time_system,cpu_percent,RSS\n")
         if os.path.splitext(inputfile)[1] in mod.INPUT_FILE_TYPE:
             self.inputfile_variant = None
         else:
@@ -404,13 +484,31 @@ class Transcode_job:
 
     @PID.setter
     def PID(self, PID):
-        self.bias_time = 0
-        self._PID = PID
+        self.PIDs = [] if PID is None else [PID]
 
     @PID.deleter
     def PID(self):
         del self._PID
 
+    @property
+    def PIDs(self):
+        """ PIDs of all processes of actual stage, e.g. decoder and encoder
+        connected by pipe. Their children are monitored too.
+        """
+        return self._PIDs
+
+    @PIDs.setter
+    def PIDs(self, PIDs):
+        self.bias_time = 0
+        self.process_tree = None
+        self._PID = PIDs[0] if PIDs else None
+        self._PIDs = list(PIDs)
+        if self.cpus:
+            # Plugins start processes pinned by job_command(), this covers
+            # processes started without taskset.
+            for pid in self._PIDs:
+                set_affinity(pid, self.cpus)
+
 
 ###########################################################
 # Code for monitoring and recording encoding resources usage
@@ -460,19 +558,542 @@ class PerpetualTimer:
         self.is_running = False
 
 
+class Useage_logger:
+    """ Buffer useage samples in memory and write them from one thread.
+
+    Samples are appended to useage logs in batches every flush_secs, files of
+    running jobs are kept open between batches.
+
+    class functions:
+        write(logfile, line): Add line to buffer of logfile.
+        flush(): Write all buffered lines now.
+        close(): Stop the writer thread, flush and close files.
+    """
+
+    def __init__(self, flush_secs=USEAGE_LOG_FLUSH_SECS):
+        self.flush_secs = flush_secs
+        self.buffers = {}
+        self.files = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="useage_logger", daemon=True)
+        self.thread.start()
+
+    def write(self, logfile, line):
+        with self.lock:
+            self.buffers.setdefault(logfile, []).append(line)
+
+    def flush(self):
+        with self.lock:
+            buffers = self.buffers
+            self.buffers = {}
+        with self.write_lock:
+            for logfile, lines in buffers.items():
+                if logfile not in self.files:
+                    self.files[logfile] = open(logfile, 'a')
+                self.files[logfile].write("".join(lines))
+                self.files[logfile].flush()
+            # Close files of jobs which are not running anymore.
+            for logfile in [f for f in self.files if f not in buffers]:
+                self.files.pop(logfile).close()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_secs):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+
+
+# Set while the monitor is running.
+useage_logger = None
+
+
+def start_monitor():
+    """ Start recording useage of running jobs.
+
+    Returns: PerpetualTimer object to pass to stop_monitor().
+    """
+    global useage_logger
+    useage_logger = Useage_logger()
+    monitor = PerpetualTimer(MONITOR_PROC_SECS, record_useage)
+    monitor.start()
+    return monitor
+
+
+def stop_monitor(monitor):
+    """ Stop recording useage and write all samples to useage logs. """
+    global useage_logger
+    monitor.cancel()
+    logger = useage_logger
+    useage_logger = None
+    logger.close()
+
+
+# Last sample of whole system useage. Used by Job_scheduler.
+system_useage = {"cpu_percent": None, "mem_available": None, "mem_total": None}
+
+
 def record_useage():
     global job_list
-    for job in (job for job in job_list if job.PID is not None):
-        proc = psutil.Process(job.PID)
-        with proc.oneshot():
-            p = proc.cpu_times()
-            p_percent = proc.cpu_percent()
-            m = proc.memory_info()
-        msg = f"{p.user},{p.system},{p.children_user},{p.children_system},{p.iowait},{p_percent},{m.rss},{m.vms}"
-        with open(job.useage_logfile, 'a') as logfile:
-            logfile.write(f"{time.time() - (proc.create_time() + job.bias_time)},{job.bias_time},{job.status['state']},{msg}\n")
-        job.cpu_useage = p_percent
-        job.mem_useage = m.rss
+    global system_useage
+    cpu_percent = psutil.cpu_percent()
+    if system_useage["cpu_percent"] is None:
+        system_useage["cpu_percent"] = cpu_percent
+    else:
+        # Samples every MONITOR_PROC_SECS are noisy, so smooth them.
+        system_useage["cpu_percent"] = 0.8 * system_useage["cpu_percent"] + 0.2 * cpu_percent
+    m = psutil.virtual_memory()
+    system_useage["mem_available"] = m.available
+    system_useage["mem_total"] = m.total
+    logger = useage_logger
+    for job in (job for job in job_list if job.PIDs):
+        tree = job.process_tree
+        if tree is None or tree.pids != job.PIDs:
+            try:
+                tree = job.process_tree = Process_tree(job.PIDs)
+            except psutil.NoSuchProcess:
+                continue  # stage already ended
+        sample = tree.sample()
+        if sample is None:
+            continue
+        now = time.time() - (tree.create_time + job.bias_time)
+        state = job.status['state']
+        p = sample
+        line = f"{now},{job.bias_time},{state},{p.user},{p.system},{p.children_user},{p.children_system},{p.iowait},{p.cpu_percent},{p.rss},{p.vms}"
+        if job.useage_log_cpus:
+            line += "," + " ".join(str(cpu) for cpu in job.cpus or ())
+        line += "\n"
+        procs_lines = "".join(f"{now},{state},{pid},{name},{user},{system},{percent},{rss}\n"
+                              for pid, name, user, system, percent, rss in sample.procs)
+        if logger is not None:
+            logger.write(job.useage_logfile, line)
+            logger.write(job.useage_procs_logfile, procs_lines)
+        else:
+            with open(job.useage_logfile, 'a') as logfile:
+                logfile.write(line)
+            with open(job.useage_procs_logfile, 'a') as logfile:
+                logfile.write(procs_lines)
+        job.cpu_useage = p.cpu_percent
+        job.cpu_useage_sum += p.cpu_percent
+        job.useage_samples += 1
+        job.mem_useage = p.rss
+        job.max_mem_useage = max(job.max_mem_useage, p.rss)
+
+
+Tree_sample = collections.namedtuple(
+    "Tree_sample", ["user", "system", "children_user", "children_system",
+                    "iowait", "cpu_percent", "rss", "vms", "procs"])
+
+
+class Process_tree:
+    """ Useage of processes and all their children.
+
+    Children created during the run are found on every sample. CPU time of
+    children which ended is kept from their last sample, so the summed CPU
+    time doesn't drop when they are reaped.
+
+    Attributes:
+        pids: PIDs of root processes.
+        create_time: Creation time of the first root process.
+
+    class functions:
+        sample(): Returns Tree_sample with summed useage and per process
+            breakdown in procs (pid, name, user, system, cpu_percent, rss).
+            None if all processes ended.
+    """
+
+    def __init__(self, pids):
+        self.pids = list(pids)
+        self.roots = [psutil.Process(pid) for pid in self.pids]
+        self.create_time = min(proc.create_time() for proc in self.roots)
+        # Process objects are kept, because cpu_percent() compares to the
+        # previous call on the same object.
+        self.procs = {proc.pid: proc for proc in self.roots}
+        self.last_times = {}
+        self.ended_user = 0
+        self.ended_system = 0
+
+    def sample(self):
+        for root in self.roots:
+            try:
+                for child in root.children(recursive=True):
+                    self.procs.setdefault(child.pid, child)
+            except psutil.NoSuchProcess:
+                pass
+        user = self.ended_user
+        system = self.ended_system
+        children_user = children_system = iowait = cpu_percent = rss = vms = 0
+        procs = []
+        for pid, proc in list(self.procs.items()):
+            try:
+                with proc.oneshot():
+                    t = proc.cpu_times()
+                    percent = proc.cpu_percent()
+                    m = proc.memory_info()
+                    name = proc.name()
+            except psutil.NoSuchProcess:  # also zombie
+                ended_user, ended_system = self.last_times.pop(pid, (0, 0))
+                self.ended_user += ended_user
+                self.ended_system += ended_system
+                user += ended_user
+                system += ended_system
+                del self.procs[pid]
+                continue
+            self.last_times[pid] = (t.user, t.system)
+            user += t.user
+            system += t.system
+            if proc in self.roots:
+                # CPU time of reaped children as reported by roots.
+                children_user += t.children_user
+                children_system += t.children_system
+            iowait += getattr(t, "iowait", 0)
+            cpu_percent += percent
+            rss += m.rss
+            vms += m.vms
+            procs.append((pid, name, t.user, t.system, percent, m.rss))
+        if not procs:
+            return None
+        return Tree_sample(user, system, children_user, children_system,
+                           iowait, cpu_percent, rss, vms, procs)
+
+
+###########################################################
+# Code for resource management
+###########################################################
+
+
+def set_affinity(pid, cpus):
+    """ Pin process with all its threads to cpus. Children inherit it. """
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            pass  # thread or process already ended
+
+
+def job_command(job, cmd):
+    """ Command of job's subprocess pinned to job.cpus.
+
+    Command is run by taskset, which pins itself and execs the encoder, so
+    threads which encoder creates at startup inherit the affinity.
+    set_affinity() after Popen() doesn't move them. preexec_fn can't be
+    used, it may deadlock in the child of threaded program. Without taskset
+    the PIDs setter of Transcode_job pins the process after start.
+
+    Returns: List with command, cmd itself if job isn't pinned.
+    """
+    taskset = shutil.which("taskset")
+    if not job.cpus or taskset is None:
+        return cmd
+    return [taskset, "-c", ",".join(str(cpu) for cpu in sorted(job.cpus))] + list(cmd)
+
+
+def parse_cpu_list(cpu_list):
+    """ Parse list of processors in format of sysfs, e.g. "0-3,8". """
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+class Core_allocator:
+    """ Assign disjoint sets of logical processors to jobs.
+
+    Whole physical cores are assigned, so SMT siblings are never shared by
+    two jobs.
+
+    Attributes:
+        cores: List of physical cores, each is tuple of its logical processors.
+        free: Set of indexes of free cores.
+
+    class functions:
+        allocate(threads): Returns list of logical processors or None if there
+            is not enough free cores.
+        release(cpus): Return logical processors from allocate().
+    """
+
+    def __init__(self, cpus=None):
+        if cpus is None:
+            cpus = os.sched_getaffinity(0)
+        cpus = set(cpus)
+        cores = []
+        for cpu in sorted(cpus):
+            if any(cpu in core for core in cores):
+                continue
+            try:
+                with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                    siblings = parse_cpu_list(f.read())
+            except OSError:
+                siblings = [cpu]
+            cores.append(tuple(c for c in siblings if c in cpus))
+        self.cores = cores
+        self.free = set(range(len(cores)))
+        self.lock = threading.Lock()
+
+    def allocate(self, threads=None):
+        with self.lock:
+            n_cores = 1
+            if threads and self.cores:
+                smt = max(len(core) for core in self.cores)
+                n_cores = max(1, math.ceil(threads / smt))
+            if len(self.free) < n_cores:
+                return None
+            chosen = sorted(self.free)[:n_cores]
+            self.free.difference_update(chosen)
+            return [cpu for i in chosen for cpu in self.cores[i]]
+
+    def release(self, cpus):
+        with self.lock:
+            for i, core in enumerate(self.cores):
+                if core[0] in cpus:
+                    self.free.add(i)
+
+
+class Job_scheduler:
+    """ Start transcode jobs only when measured CPU and free RAM allow it.
+
+    Uses samples taken by record_useage(), so the monitor must be running.
+    Resources needed by job are estimated from finished jobs of the same
+    Transcode_setting or taken from its mem_estimate and cpu_estimate.
+
+    Attributes:
+        max_workers: Maximal number of concurrently running jobs. Jobs of one
+            Transcode_setting are also limited by its concurrent attribute.
+        mem_reserve: Fraction of total RAM which is left free.
+        cpu_reserve: Number of logical processors which are left idle.
+        engine: Optional Async_engine. Jobs of plugins supporting it are run
+            on its event loop instead of pool threads.
+        allocator: Optional Core_allocator. Every job is pinned to its own
+            cores and waits until they are free.
+        stager: Optional Input_stager. Job waits until its input is staged,
+            next inputs are staged while jobs run.
+        job_done: Optional function job_done(job, exception) called when job
+            ends, exception is None if it didn't fail.
+
+    Other attributes:
+        future_jobs: Dictionary of started jobs, key is their future.
+
+    class functions:
+        run(jobs): Run jobs and wait for them. Returns futures of jobs. Jobs
+            are taken from iterable only JOB_LOOKAHEAD ahead.
+        can_start(job): Test if there are enough resources for the job.
+        estimate_mem(job): Estimate RAM needed by job in bytes.
+        estimate_cpu(job): Estimate logical processors needed by job.
+    """
+
+    def __init__(self, max_workers=1, mem_reserve=0.1, cpu_reserve=0, engine=None, allocator=None, stager=None,
+                 job_done=None):
+        self.max_workers = max_workers
+        self.job_done = job_done
+        self.engine = engine
+        self.allocator = allocator
+        self.stager = stager
+        self.mem_reserve = mem_reserve
+        self.cpu_reserve = cpu_reserve
+        # key is future, value is (job, start time)
+        self.running = {}
+        self.future_jobs = {}
+        # Measured useage of finished jobs. Key is Transcode_setting.
+        self.measured_mem = {}
+        self.measured_cpu = {}
+
+    def estimate_mem(self, job):
+        if job.transcode_set.mem_estimate is not None:
+            return job.transcode_set.mem_estimate
+        return self.measured_mem.get(job.transcode_set, DEFAULT_JOB_MEM)
+
+    def estimate_cpu(self, job):
+        if job.transcode_set.cpu_estimate is not None:
+            return job.transcode_set.cpu_estimate
+        return self.measured_cpu.get(job.transcode_set, DEFAULT_JOB_CPU)
+
+    def can_start(self, job):
+        """ Test if there are enough resources for the job.
+
+        Returns: True if the job can be started now.
+        """
+        if not self.running:
+            return True  # Always run at least one job.
+        if len(self.running) >= self.max_workers:
+            return False
+        if not self.setting_has_slot(job.transcode_set):
+            return False
+        cpu_percent = system_useage["cpu_percent"]
+        if cpu_percent is None:
+            return False  # No sample yet, wait for the monitor.
+        cpu_free = len(os.sched_getaffinity(0)) * (100 - cpu_percent) / 100 - self.cpu_reserve
+        mem_free = system_useage["mem_available"] - self.mem_reserve * system_useage["mem_total"]
+        now = time.time()
+        for running_job, started in self.running.values():
+            if now - started < SCHEDULER_SETTLE_SECS:
+                cpu_free -= self.estimate_cpu(running_job)
+                mem_free -= self.estimate_mem(running_job)
+        return cpu_free >= self.estimate_cpu(job) and mem_free >= self.estimate_mem(job)
+
+    def setting_has_slot(self, transcode_set):
+        """ Test if the Transcode_setting is under its concurrent limit. """
+        running = sum(1 for running_job, started in self.running.values()
+                      if running_job.transcode_set is transcode_set)
+        return running < setting_concurrency(transcode_set)
+
+    def _next_job(self, pending):
+        """ Pop next job to start from pending or return None.
+
+        Jobs of settings which reached their concurrent limit are skipped, but
+        the first job which waits for resources keeps its place in queue.
+        """
+        for job in pending:
+            if job.artifacts is not None:
+                if job.artifacts.fetch(job):
+                    # Identical job finished while this one was waiting.
+                    job.linked = True
+                    pending.remove(job)
+                    return job
+                if job.artifacts.is_claimed(job):
+                    continue  # identical job is encoding, wait for it
+            if self.running and not self.setting_has_slot(job.transcode_set):
+                continue
+            if self._is_staged(job) is False:
+                return None
+            if self.can_start(job):
+                if self.allocator is not None:
+                    job.cpus = self.allocator.allocate(job.transcode_set.threads)
+                    if job.cpus is None:
+                        return None
+                pending.remove(job)
+                return job
+            return None
+        return None
+
+    def _is_staged(self, job):
+        """ None if job doesn't use stager, else if its input is ready. """
+        if self.stager is None or not self.stager.is_used(job):
+            return None
+        return self.stager.ready(job)
+
+    def _prefetch(self, pending):
+        """ Start staging of next inputs in pending. """
+        if self.stager is None:
+            return
+        inputs = set()
+        for job in pending:
+            if not self.stager.is_used(job) or job.inputfile in inputs:
+                continue
+            self.stager.prefetch(job)
+            inputs.add(job.inputfile)
+            if len(inputs) >= STAGING_LOOKAHEAD:
+                break
+
+    def _job_linked(self, job):
+        """ End job which got artifacts from the store. """
+        job_list.remove(job)
+        if self.stager is not None and self.stager.is_used(job):
+            self.stager.drop(job)
+        transcode_status_update_callback(job, ["state", "finished"])
+        if job.ledger is not None:
+            job.ledger.ended(job, returncode=0)
+        if self.job_done is not None:
+            self.job_done(job, None)
+
+    def _job_done(self, job, future):
+        """ Update estimates from useage measured by record_useage(). """
+        job_list.remove(job)
+        if job.artifacts is not None:
+            try:
+                job.artifacts.release(job, future.exception() is None and not future.result()[1])
+            except OSError as e:
+                print(f"{bcolors.WARNING}Storing artifacts of {job.outputfile} failed: {e}{bcolors.ENDC}")
+        if self.stager is not None and self.stager.is_used(job):
+            self.stager.release(job)
+        if self.allocator is not None and job.cpus:
+            self.allocator.release(job.cpus)
+        if future.exception() is not None and job.status['state'] != "failed":
+            transcode_status_update_callback(job, ["state", "failed"])
+        if job.ledger is not None:
+            if future.exception() is not None:
+                job.ledger.ended(job, error=str(future.exception()))
+            else:
+                job.ledger.ended(job, returncode=future.result()[1])
+        if job.max_mem_useage:
+            self.measured_mem[job.transcode_set] = max(
+                job.max_mem_useage, self.measured_mem.get(job.transcode_set, 0))
+        if job.useage_samples:
+            self.measured_cpu[job.transcode_set] = max(
+                job.cpu_useage_sum / job.useage_samples / 100, 0.1)
+        if self.job_done is not None:
+            self.job_done(job, future.exception())
+
+    def run(self, jobs):
+        """ Run jobs and wait for them.
+
+        Args:
+            jobs: Iterable of Transcode_job objects, started in order. It can
+                be generator, jobs are created only shortly before start.
+
+        Returns: Tuple of futures with results of mod.transcode_start().
+        """
+        jobs = iter(jobs)
+        lookahead = max(JOB_LOOKAHEAD, 2 * self.max_workers)
+        pending = collections.deque()
+        futures = []
+        with cf.ThreadPoolExecutor(max_workers=self.max_workers,
+                                   thread_name_prefix='job') as pool:
+            while True:
+                while len(pending) < lookahead and (job := next(jobs, None)) is not None:
+                    if self.stager is not None and self.stager.is_used(job):
+                        self.stager.need(job)
+                    job_list.append(job)
+                    pending.append(job)
+                if not pending and not self.running:
+                    break
+                self._prefetch(pending)
+                while (job := self._next_job(pending)) is not None:
+                    if job.linked:
+                        self._job_linked(job)
+                        continue
+                    if job.artifacts is not None:
+                        job.artifacts.claim(job)
+                    if self._is_staged(job):
+                        job.inputfile_variant = self.stager.acquire(job)
+                    if job.ledger is not None:
+                        job.ledger.started(job)
+                    if self.engine is not None and async_engine.is_supported(job.mod):
+                        future = self.engine.submit(job)
+                    else:
+                        future = pool.submit(job.mod.transcode_start, job)
+                    self.running[future] = (job, time.time())
+                    self.future_jobs[future] = job
+                    futures.append(future)
+                if not self.running:
+                    # Waiting for staging, cf.wait() would return at once.
+                    if self.stager is not None:
+                        self.stager.wait(SCHEDULER_POLL_SECS)
+                    else:
+                        time.sleep(SCHEDULER_POLL_SECS)
+                    continue
+                done, not_done = cf.wait(tuple(self.running),
+                                         timeout=SCHEDULER_POLL_SECS,
+                                         return_when=cf.FIRST_COMPLETED)
+                for future in done:
+                    job, started = self.running.pop(future)
+                    self._job_done(job, future)
+        return tuple(futures)
 
 
 ###########################################################
@@ -480,6 +1101,28 @@ def record_useage():
 ###########################################################
 
 
+def setting_concurrency(transcode_set):
+    """ Get maximal number of concurrent jobs of Transcode_setting. """
+    if not transcode_set.concurrent:
+        return 1
+    elif transcode_set.concurrent == -1:
+        return len(os.sched_getaffinity(0))
+    else:
+        return transcode_set.concurrent
+        # TODO Do not use more than 61 threads under Windows.
+        # https://stackoverflow.com/questions/1006289/how-to-find-out-the-number-of-cpus-using-python
+
+
+def load_plugin(transcode_plugin):
+    """ Dynamically load transcode plugin from path. """
+    print(f"Dynamically loading source file: {transcode_plugin}")
+    spec = util.spec_from_file_location("mod", transcode_plugin)
+    mod = util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    print("Module loaded succesfully!")
+    return mod
+
+
 def transcode(binaries_ent, videofiles, transcode_set, output_path, **kwargs):
     """ Make batch transcode. One-shot function.
 
@@ -489,42 +1132,132 @@ def transcode(binaries_ent, videofiles, transcode_set, output_path, **kwargs):
         transcode_set: Transcode_setting object.
         output_path: Path to folder where transcoded videos will be outputed.
     """
-    video_info.set_defaults(binaries_ent)
-    print(f"Dynamically loading source file: {transcode_set.transcode_plugin}")
-    spec = util.spec_from_file_location("mod", transcode_set.transcode_plugin)
-    mod = util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    print("Module loaded succesfully!")
-    for video in videofiles:
-        print(f"{video} duration: {video_info.video_length_seconds(video)}")
-        print(f"{video} framerate: {video_info.video_framerate(video)}")
-        print(f"{video} calculated framecount: {video_info.video_frames(video)}")
+    transcode_batch(binaries_ent, videofiles, {"": transcode_set}, output_path,
+                    max_workers=setting_concurrency(transcode_set), **kwargs)
 
-    global job_list
-    for videofile, args in [[videofile, args] for videofile in videofiles for args in transcode_set()]:
-        job_list.append(Transcode_job(transcode_set, len(job_list), mod, args, videofile, output_path, binaries_ent, **kwargs))
 
-    # TODO limit maximum number of workers by Transcode_job concurrency
-    if not transcode_set.concurrent:
-        concurrency = 1
-    elif transcode_set.concurrent == -1:
-        concurrency = len(os.sched_getaffinity(0))
-    else:
-        concurrency = transcode_set.concurrent
-        # TODO Do not use more than 61 threads under Windows.
-        # https://stackoverflow.com/questions/1006289/how-to-find-out-the-number-of-cpus-using-python
+def transcode_batch(binaries_ent, videofiles, transcode_sets, output_path, max_workers=None,
+                    ledger=None, render_status=True, status_jsonl=None, pin_cores=False,
+                    staging_tiers=None, probe_cache=None, job_done=None, artifacts=False, **kwargs):
+    """ Make batch transcode of multiple settings on one shared pool.
 
-    monitor = PerpetualTimer(MONITOR_PROC_SECS, record_useage)
-    monitor.start()
+    Jobs of every setting are queued in order of transcode_sets and are
+    started when any worker is free. Every setting is limited by its
+    concurrent attribute.
 
-    with cf.ThreadPoolExecutor(max_workers=concurrency,
-                               thread_name_prefix='job') as pool:
-        futures = tuple(
-            pool.submit(mod.transcode_start, job) for job in job_list if not job.finished)
+    Args:
+        binaries_ent: Dictionary with binaries and their path.
+        videofiles: Iterable containing path to video files.
+        transcode_sets: Dictionary of Transcode_setting objects.
+        output_path: Path to folder where transcoded videos will be outputed.
+        max_workers: Maximal number of all concurrent jobs. By default number
+            of processors.
+        ledger: Path to job ledger database, by default "jobs.sqlite" in
+            output_path. Jobs finished in previous run are skipped. Set to
+            False to disable.
+        render_status: Print status of jobs every STATUS_RENDER_SECS.
+        status_jsonl: Optional, path to file for status updates as JSON lines.
+        pin_cores: Pin every job to its own physical cores, their count is set
+            by threads of Transcode_setting. Assignment is in useage log.
+        staging_tiers: Optional list of tuples (path, max_used, max_entries),
+            fastest first, e.g. [("/dev/shm/ect", 0.9, 1), ("/mnt/nvme/ect",
+            0.9, None)]. Inputs are expanded to raw video there before their
+            jobs start and removed at the end.
+        probe_cache: Path to database of probed video properties, by default
+            "probe.sqlite" in output_path. Set to False to disable.
+        job_done: Optional function job_done(job, exception) called when job
+            ends or is skipped as finished in previous run. exception is None
+            if job didn't fail.
+        artifacts: Optional, path to content addressed store of encodes.
+            Share it by campaigns to encode identical jobs (e.g. reference
+            anchors) once. Every input is hashed once, see
+            artifact_store.file_digest(). Disabled by default.
+        kwargs: Passed to Transcode_job.
+    """
+    video_info.set_defaults(binaries_ent)
+    if probe_cache is None:
+        create_dir(output_path)
+        probe_cache = os.path.join(output_path, "probe.sqlite")
+    video_info.set_cache(probe_cache or None)
+    mods = {}
+    for transcode_set in transcode_sets.values():
+        if transcode_set.transcode_plugin not in mods:
+            mods[transcode_set.transcode_plugin] = load_plugin(transcode_set.transcode_plugin)
+    videofiles = list(videofiles)
+    infos = video_info.probe_many(videofiles)
+    for video, info in infos.items():
+        print(f"{video} duration: {info.duration}")
+        print(f"{video} framerate: {info.framerate}")
+        print(f"{video} calculated framecount: {video_info.video_frames(video)}")
 
-    for future in futures:
-        print(f"Exceptions on job {future.result()[0]}: {future.exception()}")
-    monitor.cancel()
+    if ledger is None:
+        ledger = os.path.join(output_path, "jobs.sqlite")
+    if ledger is not False:
+        job_ledger = Job_ledger(ledger)
+        interrupted = job_ledger.interrupted()
+        if interrupted:
+            print(f"{bcolors.WARNING}Requeueing {len(interrupted)} unfinished jobs from ledger {ledger}{bcolors.ENDC}")
+        kwargs["ledger"] = job_ledger
+    if artifacts:
+        store = Artifact_store(artifacts)
+        kwargs["artifacts"] = store
+
+    skipped = []
+
+    def make_jobs():
+        """ Create jobs lazily, as the scheduler takes them. """
+        for transcode_set in transcode_sets.values():
+            mod = mods[transcode_set.transcode_plugin]
+            for videofile in videofiles:
+                if transcode_set.videofiles is not None and videofile not in transcode_set.videofiles:
+                    continue
+                for args in transcode_set.grid():
+                    job = Transcode_job(transcode_set, next(job_ids), mod, args, videofile, output_path, binaries_ent, **kwargs)
+                    if job.finished:
+                        if not job.linked:
+                            skipped.append(job.job_id)
+                        if job_done is not None:
+                            job_done(job, None)
+                        continue
+                    yield job
+
+    if max_workers is None:
+        max_workers = len(os.sched_getaffinity(0))
+
+    subscribers = []
+    if render_status:
+        subscribers.append(Status_renderer())
+    if status_jsonl is not None:
+        subscribers.append(Jsonl_status_writer(status_jsonl))
+    for subscriber in subscribers:
+        status_bus.subscribe(subscriber)
+    monitor = start_monitor()
+    try:
+        engine = async_engine.Async_engine()
+        allocator = Core_allocator() if pin_cores else None
+        stager = Input_stager(staging_tiers, binaries_ent) if staging_tiers else None
+        scheduler = Job_scheduler(max_workers=max_workers, engine=engine, allocator=allocator, stager=stager,
+                                  job_done=job_done)
+        try:
+            futures = scheduler.run(make_jobs())
+        finally:
+            engine.close()
+            if stager is not None:
+                stager.clean()
+
+        if skipped:
+            print(f"Skipped {len(skipped)} jobs finished in previous run.")
+        if artifacts and store.linked:
+            print(f"Copied stored artifacts of {store.linked} jobs from {artifacts}.")
+        for future in futures:
+            # result() would raise exception of failed job and stop the batch.
+            job = scheduler.future_jobs[future]
+            print(f"Exceptions on job {job.job_id} {job.outputfile}: {future.exception()}")
+    finally:
+        stop_monitor(monitor)
+        for subscriber in subscribers:
+            status_bus.unsubscribe(subscriber)
+            subscriber.close()
 
 
 ###########################################################
@@ -532,6 +1265,173 @@ def transcode(binaries_ent, videofiles, transcode_set, output_path, **kwargs):
 ###########################################################
 
 
+class Status_event_bus:
+    """ Publish status updates of jobs to subscribers.
+
+    Subscriber is called as callback(job, stat) from the thread of the plugin,
+    so it must be fast. With interval the progress updates are throttled to
+    one per interval for every job, state changes are always passed.
+
+    class functions:
+        subscribe(callback, interval): Add subscriber. Returns the callback.
+        unsubscribe(callback): Remove subscriber.
+        publish(job, stat): Call subscribers.
+    """
+
+    def __init__(self):
+        self.subscribers = ()
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback, interval=None):
+        with self.lock:
+            self.subscribers = self.subscribers + ((callback, interval, {}),)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s[0] is not callback)
+
+    def publish(self, job, stat):
+        now = None
+        for callback, interval, last in self.subscribers:
+            if interval is not None and stat[0] != "state":
+                now = now or time.monotonic()
+                if now - last.get(job.job_id, 0) < interval:
+                    continue
+                last[job.job_id] = now
+            callback(job, stat)
+
+
+status_bus = Status_event_bus()
+
+
+class Progress_publisher:
+    """ Coalesce progress updates of job and publish them at limited rate.
+
+    Plugin passes whole blocks of progress values. Values are merged and
+    only those which changed are passed to transcode_status_update_callback()
+    at most once per interval. progress_perc is computed from "frame" and
+    the frame count of the input, which is looked up once per job.
+
+    Attributes:
+        job: Transcode_job object.
+        interval: Minimal seconds between publishing, by default
+            progress_interval of the job or PROGRESS_PUBLISH_SECS.
+
+    class functions:
+        update(block, end): Merge dictionary of progress values, publish them
+            if interval passed or progress ended.
+        flush(): Publish merged values now.
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        if interval is None:
+            interval = job.kwargs.get("progress_interval")
+        self.interval = PROGRESS_PUBLISH_SECS if interval is None else interval
+        if job.frames_total is None:
+            job.frames_total = video_info.video_frames(job.inputfile)
+        self.pending = {}
+        self.last = 0
+
+    def update(self, block, end=False):
+        self.pending.update(block)
+        frame = block.get("frame")
+        if end:
+            self.pending["progress_perc"] = "100.00"
+        elif frame is not None and frame.isdigit() and self.job.frames_total:
+            self.pending["progress_perc"] = f"{int(frame) * 100 / self.job.frames_total:.2f}"
+        now = time.monotonic()
+        if end or now - self.last >= self.interval:
+            self.last = now
+            self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        status = self.job.status
+        for key, value in pending.items():
+            if status.get(key) != value:
+                transcode_status_update_callback(self.job, [key, value])
+
+
+class Status_renderer:
+    """ Print summary of jobs at most once per interval.
+
+    Subscribe to status_bus, the printing is done in its own thread.
+
+    class functions:
+        render(): Print states of jobs and progress of running jobs.
+        close(): Stop the thread and print final status.
+    """
+
+    def __init__(self, interval=STATUS_RENDER_SECS, max_lines=20, stream=None):
+        self.interval = interval
+        self.max_lines = max_lines
+        self.stream = stream
+        self.changed = False
+        # Ended jobs are removed from job_list, so they are counted here.
+        self.ended = collections.Counter()
+        self.ended_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="status_renderer", daemon=True)
+        self.thread.start()
+
+    def __call__(self, job, stat):
+        if stat[0] == "state" and stat[1] in ("finished", "failed"):
+            with self.ended_lock:
+                self.ended[stat[1]] += 1
+        self.changed = True
+
+    def render(self):
+        jobs = list(job_list)
+        with self.ended_lock:
+            counts = collections.Counter(self.ended)
+        counts.update(job.status['state'] for job in jobs
+                      if job.status['state'] not in ("finished", "failed"))
+        lines = [f"{bcolors.BOLD}jobs: " + ", ".join(f"{state}: {n}" for state, n in counts.items()) + bcolors.ENDC]
+        running = [job for job in jobs if job.status['state'] not in ("waiting", "finished", "failed")]
+        for job in running[:self.max_lines]:
+            lines.append(f"job id {job.job_id}, state: {job.status['state']}, progress: {job.status['progress_perc']}%, fps: {job.status['fps']}, speed: {job.status['speed']}")
+        if len(running) > self.max_lines:
+            lines.append(f"... and {len(running) - self.max_lines} more running jobs")
+        print("\n".join(lines), file=self.stream or sys.stdout, flush=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.changed:
+                self.changed = False
+                self.render()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.render()
+
+
+class Jsonl_status_writer:
+    """ Write status updates of jobs to file as JSON lines.
+
+    Attributes:
+        path: Path to output file, lines are appended.
+        keys: Optional, iterable of status keys to write. By default all.
+    """
+
+    def __init__(self, path, keys=None):
+        self.path = path
+        self.keys = None if keys is None else set(keys)
+        self.logger = Useage_logger()
+
+    def __call__(self, job, stat):
+        if self.keys is None or stat[0] in self.keys:
+            self.logger.write(self.path, json.dumps(
+                {"time": time.time(), "job_id": job.job_id,
+                 "outputfile": job.outputfile, "key": stat[0],
+                 "value": stat[1]}) + "\n")
+
+    def close(self):
+        self.logger.close()
+
+
 def transcode_status_update_callback(job, stat):
     """ Callback from module to update status.
 
@@ -543,12 +1443,9 @@ def transcode_status_update_callback(job, stat):
         job.status[stat[0]] = stat[1]
     except IndexError:
         print(f"IndexError: {stat}")
-    if stat[0] == "progress":
-        try:
-            for i in range(len(job_list)):
-                print(f"job id {i}, state: {job_list[i].status['state']}, progress: {job_list[i].status['progress_perc']}%")
-        except KeyError:
-            pass
+    if stat[0] == "state" and job.ledger is not None:
+        job.ledger.set_state(job, stat[1])
+    status_bus.publish(job, stat)
 
 
 def transcode_stdout_update_callback(job, line):
@@ -590,13 +1487,9 @@ def transcode_check(binaries_ent,
 
     Returns: True if all checks ended with return code 0.
     """
-    print(f"Dynamically loading source file: {transcode_set.transcode_plugin}")
-    spec = util.spec_from_file_location("mod", transcode_set.transcode_plugin)
-    mod = util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    print("Module loaded succesfully!")
+    mod = load_plugin(transcode_set.transcode_plugin)
     args = []
-    if transcode_set().ndim == 1:
+    if not transcode_set.param_find()[1]:
         args = transcode_set()
     elif param_pos is None and mode == "quick":
         args = transcode_set.edge_cases()
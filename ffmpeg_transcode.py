@@ -1,7 +1,9 @@
 import os
 import re
+import asyncio
 import subprocess
 import threading
+import collections
 import encoders_comparison_tool as enc
 import video_info
 
@@ -9,6 +11,7 @@ import video_info
 OUTPUT_UNSUPORTED_BY_FFMPEG = False
 INPUT_FILE_TYPE = ("mkv", "yuv", "y4m")
 OUTPUT_FILE_TYPE = "mkv"
+STAGED_FILE_TYPE = "y4m"
 
 
 # Colors in terminal
@@ -25,6 +28,10 @@ class bcolors:
 
 
 config_test_quick = {}
+# Size of reads from stdout on event loop. ffmpeg ends stats lines by \r, so
+# output is split on both \r and \n, not by StreamReader.readline().
+STDOUT_CHUNK = 64 * 1024
+_LINE_SEPARATOR = re.compile(rb"\r\n|\r|\n")
 
 
 # Internal function
@@ -43,18 +50,18 @@ def _transcode_cmd(job, progress_p_w, run, decode_to_null):
     elif job.two_pass:
         if(run == 1):
             cmd = [
-                job.binary, "-i", job.inputfile, "-nostdin", "-pass", str(1), "-y",
+                job.binary, "-i", job.inputfile_variant or job.inputfile, "-nostdin", "-pass", str(1), "-y",
                 "-progress", str("pipe:" + str(progress_p_w)), "-passlogfile",
                 str(job.job_id)] + list(job.args) + ["-f", "null", nullfile]
         elif(run == 2):
             cmd = [
-                job.binary, "-i", job.inputfile, "-nostdin", "-progress",
+                job.binary, "-i", job.inputfile_variant or job.inputfile, "-nostdin", "-progress",
                 str("pipe:" + str(progress_p_w)), "-pass", str(2),
                 "-passlogfile", str(job.job_id)
             ] + list(job.args) + [job.outputfile]
     else:
         cmd = [
-            job.binary, "-i", job.inputfile, "-nostdin", "-progress",
+            job.binary, "-i", job.inputfile_variant or job.inputfile, "-nostdin", "-progress",
             str("pipe:" + str(progress_p_w))
         ] + list(job.args) + [job.outputfile]
     print(" ".join(cmd))  # TODO Debug output
@@ -68,7 +75,7 @@ def _transcode(job, ffreport, run, decode_to_null=False):
     if os.name == "posix":
         cmd = _transcode_cmd(job, fdw, run, decode_to_null)
         process = subprocess.Popen(
-            cmd,
+            enc.job_command(job, cmd),
             pass_fds=[fdw],
             text=True,
             stdout=subprocess.PIPE,
@@ -217,29 +224,150 @@ def transcode_get_info_stop(fdr, fdw):
     transcode_clean(fdw)
 
 
+class Progress_parser:
+    """ Parser of ffmpeg -progress output.
+
+    Lines "key=value" are collected into block, which ends by "progress"
+    key. Whole block is passed to enc.Progress_publisher, so status is
+    published at limited rate and not for every line.
+
+    class functions:
+        feed(line): Process one line. Returns True at the end of progress.
+    """
+
+    def __init__(self, job):
+        self.publisher = enc.Progress_publisher(job)
+        self.block = {}
+
+    def feed(self, line):
+        key, sep, value = line.partition("=")
+        if not sep:
+            return False
+        key = key.strip()
+        value = value.strip()
+        self.block[key] = value
+        if key != "progress":
+            return False
+        end = value == "end"
+        self.publisher.update(self.block, end)
+        self.block.clear()
+        return end
+
+
 # Get info back to encoders_comparison_tool. Function must call callback function when the status changes.
 def transcode_get_info(job, process, fdr):
     print("transcodeGetInfo {} started.".format(job.job_id))
+    parser = Progress_parser(job)
     fdr_open = os.fdopen(fdr)
     for line in fdr_open:
-        stat = re.sub(r"[\n\t\s]*", "", line).rsplit("=")
-        if stat[0] == "frame":
-            calc = ["progress_perc", ""]
-            calc[1] = format((int(stat[1]) / video_info.video_frames(job.inputfile) * 100), '.2f')
-            enc.transcode_status_update_callback(job, calc)
-        if line == "progress=end\n":
-            calc[1] = "100.00"
-            enc.transcode_status_update_callback(job, calc)
-        enc.transcode_status_update_callback(job, stat)
-        if line == "progress=end\n":
+        if parser.feed(line):
             break
 
 
+# Read progress pipe on event loop.
+async def _read_progress(job, fdr):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, protocol = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fdr, "rb"))
+    parser = Progress_parser(job)
+    try:
+        async for line in reader:
+            if parser.feed(line.decode()):
+                break
+    finally:
+        transport.close()
+
+
+# Read stdout on event loop, keep the last lines for error message.
+async def _read_stdout(job, process, output):
+    def line_done(line):
+        line = line.decode(errors="replace")
+        output.append(line)
+        enc.transcode_stdout_update_callback(job, line)
+
+    rest = b""
+    while chunk := await process.stdout.read(STDOUT_CHUNK):
+        lines = _LINE_SEPARATOR.split(rest + chunk)
+        rest = lines.pop()
+        if len(rest) > STDOUT_CHUNK:  # no separator, don't buffer forever
+            lines.append(rest)
+            rest = b""
+        for line in lines:
+            if line:
+                line_done(line)
+    if rest:
+        line_done(rest)
+
+
+# Run one ffmpeg process on event loop.
+async def _transcode_async(job, ffreport, run, decode_to_null=False):
+    ffenv = {**os.environ, **ffreport}  # Add aditional enviroment variables
+    fdr, fdw = os.pipe()
+    cmd = _transcode_cmd(job, fdw, run, decode_to_null)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *enc.job_command(job, cmd),
+            pass_fds=[fdw],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=ffenv,
+        )
+    finally:
+        # Child has its own copy, progress pipe gets EOF when it exits.
+        transcode_clean(fdw)
+    job.PID = process.pid
+    output = collections.deque(maxlen=50)
+    readers = [asyncio.ensure_future(_read_stdout(job, process, output)),
+               asyncio.ensure_future(_read_progress(job, fdr))]
+    try:
+        await asyncio.gather(*readers)
+        await process.wait()
+    except BaseException:
+        # Don't leave running child and open pipes behind.
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        await process.wait()
+        raise
+    finally:
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        job.PID = None
+    if (process.returncode > 0):
+        raise ValueError(
+            "command: {}\n failed with returncode: {}\nProgram output:\n{}"
+            .format(" ".join(cmd), process.returncode, "\n".join(output)))
+    return process
+
+
+# Start transcode as coroutine. All pipes are read on one event loop, used by
+# async_engine on posix platforms instead of transcode_start.
+async def transcode_start_async(job):
+    if job.two_pass:
+        enc.transcode_status_update_callback(job, ["state", "first pass"])
+        await _transcode_async(job, {"FFREPORT": f"file={job.basename}_first_pass.report"}, 1)
+        enc.transcode_status_update_callback(job, ["state", "second pass"])
+        process = await _transcode_async(job, {"FFREPORT": f"file={job.report}"}, 2)
+    elif not job.only_decode:
+        enc.transcode_status_update_callback(job, ["state", "running"])
+        process = await _transcode_async(job, {"FFREPORT": f"file={job.report}"}, 1)
+    if job.measure_decode or job.only_decode:
+        enc.transcode_status_update_callback(job, ["state", "measuring decode"])
+        process = await _transcode_async(job, {"FFREPORT": f"file={job.basename}_decode.report"}, 1, decode_to_null=True)
+    job.finished = True
+    enc.transcode_status_update_callback(job, ["state", "finished"])
+    return job.job_id, process.returncode
+
+
 # Test if configuration works
 def transcode_check_arguments(binpath, filename, args, binaries, mode="quick"):
     key = "".join(args)
     if mode == "slow":
-        framerate = video_info.video_framerate(binaries, filename)
+        framerate = video_info.video_framerate(filename, binaries)
         testtime = str(2 / framerate)  # two or one frame to encode
         outputfile = "test.mkv"
         command = [binpath, "-i", filename, "-t", testtime]
@@ -1,5 +1,4 @@
 import os
-import subprocess
 import pickle
 import matplotlib.pyplot as plt
 import numpy as np
@@ -193,37 +192,14 @@ binaries = {
     }
 
 vi.set_defaults(binaries)
+# Probed properties are kept between runs, shared by worker processes.
+vi.set_cache(os.path.join(top_dir, "probe.sqlite"))
 
 
 def video_stream_size(videofile_path):
     if videofile_path.endswith(".266"):
         return os.path.getsize(videofile_path[0:-4] + ".266") / 1024  #in KiB
-    log = videofile_path + ".stream_size"
-    if os.path.exists(log):
-        with open(log, "r") as f:
-            s = f.readline()
-        print("stream size hit!")
-        return float(s)
-    result = subprocess.run(
-        [
-            "ffmpeg",
-            "-hide_banner",
-            "-i", videofile_path,
-            "-map", "0:v:0",
-            "-c", "copy",
-            "-f", "null", "-"
-        ],
-        capture_output=True,
-        text=True,
-    )
-    try:
-        size = (result.stderr.rsplit("\n")[-2].rsplit(" ")[0].rsplit(":")[1][0: -2])
-        s = float(size)  # in KiB
-        with open(log, "w") as f:
-            f.write(str(s))
-        return s
-    except ValueError:
-        raise ValueError(result.stderr.rstrip("\n"))
+    return vi.video_stream_size(videofile_path)  # in KiB
 
 
 def video_stream_length(videofile_path):
@@ -231,16 +207,7 @@ def video_stream_length(videofile_path):
         videofile = videofile_path[:-4] + ".mkv"
     else:
         videofile = videofile_path
-    log = videofile + ".stream_length"
-    if os.path.exists(log):
-        with open(log, "r") as f:
-            s = f.readline()
-        print("stream length hit!")
-        return float(s)
-    result = vi.video_length_seconds(videofile)
-    with open(log, "w") as f:
-        f.write(str(result))
-    return result
+    return vi.video_length_seconds(videofile)
 
 
 def video_stream_frames(videofile_path):
@@ -248,16 +215,8 @@ def video_stream_frames(videofile_path):
         videofile = videofile_path[:-4] + ".mkv"
     else:
         videofile = videofile_path
-    log = videofile + ".stream_frames"
-    if os.path.exists(log):
-        with open(log, "r") as f:
-            s = f.readline()
-        print("stream framenum hit!")
-        return int(s)
-    result = vi.video_frames(videofile)
-    with open(log, "w") as f:
-        f.write(str(result))
-    return result
+    # per frame values need exact count, not framerate * duration
+    return vi.video_frames(videofile, exact=True)
 
 
 def series_label(key, sequence=None):
@@ -981,6 +940,10 @@ else:
                 if f.endswith(".mkv"):
                     videofiles_paths.append(VideoFile(os.path.join(directory[0], f)))
 
+    print("Probing video files:\n")
+    # fill persistent probe cache in parallel, workers below only read it
+    vi.probe_many([f.path_without_ext + ".mkv" for f in videofiles_paths], raise_errors=False)
+
     print("Reading log files:\n")
     with cf.ProcessPoolExecutor(max_workers=12) as executor:
         futures = tuple(executor.submit(async_load, f) for f in videofiles_paths)
@@ -0,0 +1,239 @@
+""" Staging of input sequences on faster storage.
+
+Sources are kept compressed (e.g. ffvhuff) on slow disks and before their
+jobs start they are expanded to raw video on the fastest tier with free
+space (tmpfs, NVMe SSD, ...). Staged sequences are reference counted by
+queued jobs and the least recently needed ones are evicted when space is
+needed.
+
+Plugin declares STAGED_FILE_TYPE ("yuv" or "y4m") to use staging, the
+staged path is set to job.inputfile_variant before transcode_start().
+"""
+import os
+import time
+import zlib
+import shutil
+import subprocess
+import threading
+import concurrent.futures as cf
+import video_info
+
+
+# Returned by staging when there is no space now, but running jobs will free it.
+_RETRY = object()
+
+
+class Staging_tier:
+    """ Storage for staged sequences.
+
+    Attributes:
+        path: Directory for staged sequences.
+        max_used: Maximal used fraction of the filesystem capacity.
+        max_entries: Optional, maximal number of staged sequences, e.g. 1 for
+            RAM.
+    """
+
+    def __init__(self, path, max_used=0.9, max_entries=None):
+        self.path = path
+        self.max_used = max_used
+        self.max_entries = max_entries
+        os.makedirs(path, exist_ok=True)
+
+    def fits(self, size, entries):
+        if self.max_entries is not None and entries >= self.max_entries:
+            return False
+        usage = shutil.disk_usage(self.path)
+        return usage.used + size <= self.max_used * usage.total
+
+
+class _Staged:
+    def __init__(self, inputfile, file_type):
+        self.inputfile = inputfile
+        self.file_type = file_type
+        self.path = None
+        self.tier = None
+        self.size = 0
+        self.needed = 0  # queued jobs which will use it
+        self.active = 0  # running jobs which use it
+        self.last_used = 0
+        self.future = None
+
+
+class Input_stager:
+    """ Place input sequences on the fastest tier with free space.
+
+    Attributes:
+        tiers: List of Staging_tier objects or tuples of their arguments,
+            fastest first.
+        binaries_ent: Dictionary with binaries and their path.
+
+    class functions:
+        need(job): Register queued job which will use staged input.
+        prefetch(job): Start staging input of job if it isn't staged.
+        ready(job): Test if input of job is staged, starts staging if not.
+        wait(timeout): Wait until some staging ends or timeout.
+        acquire(job): Returns staged path for job which is ready.
+        release(job): Job ended, its staged input can be evicted.
+        drop(job): Queued job won't run, its staged input can be evicted.
+        clean(): Remove all staged files.
+    """
+
+    def __init__(self, tiers, binaries_ent):
+        self.tiers = [t if isinstance(t, Staging_tier) else Staging_tier(*t) for t in tiers]
+        self.binaries_ent = binaries_ent
+        self.staged = {}
+        self.lock = threading.Lock()
+        self.uses = 0
+        # One sequence is staged at time, more would only compete for disks.
+        self.executor = cf.ThreadPoolExecutor(max_workers=1, thread_name_prefix='stager')
+
+    @staticmethod
+    def is_used(job):
+        return getattr(job.mod, "STAGED_FILE_TYPE", None) is not None
+
+    def _entry(self, job):
+        key = (job.inputfile, job.mod.STAGED_FILE_TYPE)
+        if key not in self.staged:
+            self.staged[key] = _Staged(*key)
+        return self.staged[key]
+
+    def need(self, job):
+        with self.lock:
+            self._entry(job).needed += 1
+
+    def _submit(self, entry, job):
+        """ Start staging of entry unless it is staged or staging. """
+        if entry.future is not None and entry.future.done() and entry.future.result() is _RETRY:
+            entry.future = None
+        if entry.future is None:
+            entry.future = self.executor.submit(self._stage, entry, job)
+        return entry.future
+
+    def prefetch(self, job):
+        with self.lock:
+            self._submit(self._entry(job), job)
+
+    def ready(self, job):
+        with self.lock:
+            future = self._submit(self._entry(job), job)
+            return future.done() and future.result() is not _RETRY
+
+    def wait(self, timeout):
+        with self.lock:
+            futures = [e.future for e in self.staged.values()
+                       if e.future is not None and not e.future.done()]
+        if futures:
+            cf.wait(futures, timeout=timeout, return_when=cf.FIRST_COMPLETED)
+        else:
+            time.sleep(timeout)
+
+    def acquire(self, job):
+        with self.lock:
+            entry = self._entry(job)
+            entry.active += 1
+            self.uses += 1
+            entry.last_used = self.uses
+            if entry.future is None:  # evicted after ready()
+                entry.future = self.executor.submit(self._stage, entry, job)
+            future = entry.future
+        path = future.result()
+        if path is None or path is _RETRY:
+            return job.mod.get_input_variant(job.inputfile)
+        return path
+
+    def release(self, job):
+        with self.lock:
+            entry = self._entry(job)
+            entry.active -= 1
+            entry.needed -= 1
+
+    def drop(self, job):
+        with self.lock:
+            self._entry(job).needed -= 1
+
+    def _estimate_size(self, entry):
+        frames = video_info.video_frames(entry.inputfile)
+        dimensions = video_info.video_dimensions(entry.inputfile)
+        pix_fmt = video_info.video_pix_fmt(entry.inputfile)
+        size = frames * video_info.raw_frame_size(dimensions, pix_fmt)
+        if entry.file_type == "y4m":
+            size += frames * len("FRAME\n")
+        # margin for stream header and frame count from duration
+        return int(size * 1.01) + 1024 * 1024
+
+    def _evict(self, tier, size):
+        """ Free space on tier by evicting sequences which are not needed.
+
+        Sequences which no queued job needs are evicted, least recently used
+        first. Returns True if the size fits.
+        """
+        entries = [e for e in self.staged.values() if e.tier is tier]
+        candidates = sorted((e for e in entries if e.active == 0 and e.needed <= 0),
+                            key=lambda e: e.last_used)
+        while not tier.fits(size, len(entries)):
+            if not candidates:
+                return False
+            victim = candidates.pop(0)
+            print(f"Evicting staged {victim.path}")
+            os.remove(victim.path)
+            victim.tier = None
+            victim.path = None
+            victim.future = None
+            entries.remove(victim)
+        return True
+
+    def _place(self, entry, size):
+        with self.lock:
+            for tier in self.tiers:
+                if self._evict(tier, size):
+                    entry.tier = tier
+                    entry.size = size
+                    name = os.path.splitext(os.path.basename(entry.inputfile))[0]
+                    # Inputs from different folders can have same name.
+                    name = f"{name}_{zlib.crc32(os.path.abspath(entry.inputfile).encode()):08x}"
+                    entry.path = os.path.join(tier.path, f"{name}.{entry.file_type}")
+                    return entry.path
+        return None
+
+    def _stage(self, entry, job):
+        try:
+            size = self._estimate_size(entry)
+        except (ValueError, OSError) as e:
+            # Failed future would stop the scheduler, use source instead.
+            print(f"Size of staged {entry.inputfile} unknown, using source: {e}")
+            return None
+        path = self._place(entry, size)
+        if path is None:
+            with self.lock:
+                if any(e.active > 0 for e in self.staged.values() if e.tier is not None):
+                    return _RETRY  # wait until running jobs release space
+            print(f"No staging tier has {size} B free for {entry.inputfile}, using source.")
+            return None
+        print(f"Staging {entry.inputfile} to {path}")
+        fmt = "rawvideo" if entry.file_type == "yuv" else "yuv4mpegpipe"
+        tmp = path + ".part"
+        result = subprocess.run(
+            [self.binaries_ent["ffmpeg"], "-v", "error", "-nostdin",
+             "-i", entry.inputfile, "-map", "0:v:0", "-strict", "-1",
+             "-f", fmt, "-y", tmp],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"Staging of {entry.inputfile} failed, using source:\n{result.stderr}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            with self.lock:
+                entry.tier = None
+                entry.path = None
+            return None
+        os.replace(tmp, path)
+        return path
+
+    def clean(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for entry in self.staged.values():
+                if entry.path is not None and os.path.exists(entry.path):
+                    os.remove(entry.path)
+            self.staged = {}
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+class Job_ledger:
+    """ Persistent record of Transcode_job states in SQLite database.
+
+    Every job is identified by its output file and stage ("encode" or
+    "decode" for only_decode runs). When the campaign is interrupted, rerun of
+    transcode() skips jobs which are finished, their encoded file exists and
+    their plugin, binary and args are same as recorded.
+
+    Attributes:
+        path: Path to SQLite database file.
+
+    class functions:
+        is_finished(job): True if job with same settings finished in previous
+            run.
+        queued(job): Record job as waiting.
+        started(job): Record start time of job.
+        set_state(job, state): Record state reported by plugin.
+        ended(job, returncode, error): Record end of job.
+        interrupted(): List of jobs which were not finished.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                 outputfile TEXT NOT NULL,
+                                 stage TEXT NOT NULL,
+                                 plugin TEXT,
+                                 binary TEXT,
+                                 args TEXT,
+                                 inputfile TEXT,
+                                 state TEXT,
+                                 returncode INTEGER,
+                                 error TEXT,
+                                 queued REAL,
+                                 started REAL,
+                                 ended REAL,
+                                 PRIMARY KEY (outputfile, stage))""")
+            self.conn.commit()
+
+    @staticmethod
+    def _key(job):
+        return job.outputfile, "decode" if job.only_decode else "encode"
+
+    @staticmethod
+    def _settings(job):
+        return (job.transcode_set.transcode_plugin, json.dumps(job.binary),
+                json.dumps([str(a) for a in job.args]))
+
+    def _execute(self, sql, params):
+        with self.lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def is_finished(self, job):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state, plugin, binary, args FROM jobs WHERE outputfile=? AND stage=?",
+                self._key(job)).fetchone()
+        if row is None or row[0] != "finished" or not os.path.isfile(job.encodedfile):
+            return False
+        # Same output name made by other settings must be encoded again.
+        return tuple(row[1:]) == self._settings(job)
+
+    def queued(self, job):
+        self._execute("""INSERT INTO jobs (outputfile, stage, plugin, binary,
+                         args, inputfile, state, queued)
+                         VALUES (?, ?, ?, ?, ?, ?, 'waiting', ?)
+                         ON CONFLICT (outputfile, stage) DO UPDATE SET
+                         plugin=excluded.plugin, binary=excluded.binary,
+                         args=excluded.args, inputfile=excluded.inputfile,
+                         state='waiting', returncode=NULL, error=NULL,
+                         queued=excluded.queued, started=NULL, ended=NULL""",
+                      (*self._key(job), *self._settings(job),
+                       job.inputfile, time.time()))
+
+    def started(self, job):
+        self._execute("UPDATE jobs SET state='started', started=? WHERE outputfile=? AND stage=?",
+                      (time.time(), *self._key(job)))
+
+    def set_state(self, job, state):
+        self._execute("UPDATE jobs SET state=? WHERE outputfile=? AND stage=?",
+                      (state, *self._key(job)))
+
+    def ended(self, job, returncode=None, error=None):
+        state = "finished" if error is None and not returncode else "failed"
+        self._execute("""UPDATE jobs SET state=?, returncode=?, error=?, ended=?
+                         WHERE outputfile=? AND stage=?""",
+                      (state, returncode, error, time.time(), *self._key(job)))
+
+    def interrupted(self):
+        """ List jobs which were not finished.
+
+        Returns: List of tuples (outputfile, stage, state).
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT outputfile, stage, state FROM jobs WHERE state != 'finished'").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
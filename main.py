@@ -77,3 +77,5 @@ enc.transcode(binaries, inputfiles_list, transcode_set["optionsd"], outputpath,
 #enc.transcode(binaries, inputfiles_list, transcode_set["options2"], outputpath)
 #enc.transcode(binaries, inputfiles_list, transcode_set["options3"], outputpath)
 #enc.transcode(binaries, inputfiles_list, transcode_set["options3"], outputpath, only_decode=True, append_useage_log=True)
+# Run all settings on one shared pool, each limited by its concurrent value.
+#enc.transcode_batch(binaries, inputfiles_list, transcode_set, outputpath)
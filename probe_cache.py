@@ -0,0 +1,69 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+class Probe_cache:
+    """ Persistent cache of video properties in SQLite database.
+
+    Values are stored as JSON per file and kind of value ("probe",
+    "stream_size", ...). Entry is valid only while size and modification time
+    of the file are same, so changed files are probed again. Database can be
+    shared by threads, ProcessPoolExecutor workers and concurrent runs.
+
+    Attributes:
+        path: Path to SQLite database file.
+
+    class functions:
+        get(videofile_path, kind): Cached value, raises KeyError if there is none.
+        put(videofile_path, kind, value): Store value for current file version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS probe (
+                        path TEXT NOT NULL,
+                        kind TEXT NOT NULL,
+                        size INTEGER,
+                        mtime_ns INTEGER,
+                        value TEXT,
+                        PRIMARY KEY (path, kind))""")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite connection can't be used by other thread or forked process
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.local.conn = sqlite3.connect(self.path, timeout=30)
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    @staticmethod
+    def _key(videofile_path):
+        stat = os.stat(videofile_path)
+        return os.path.abspath(videofile_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, videofile_path, kind):
+        try:
+            path, size, mtime_ns = self._key(videofile_path)
+        except OSError:
+            raise KeyError(videofile_path)
+        row = self._conn().execute(
+            "SELECT value FROM probe WHERE path=? AND kind=? AND size=? AND mtime_ns=?",
+            (path, kind, size, mtime_ns)).fetchone()
+        if row is None:
+            raise KeyError(videofile_path)
+        return json.loads(row[0])
+
+    def put(self, videofile_path, kind, value):
+        try:
+            path, size, mtime_ns = self._key(videofile_path)
+        except OSError:
+            return
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?)",
+                     (path, kind, size, mtime_ns, json.dumps(value)))
+        conn.commit()
@@ -0,0 +1,615 @@
+""" Adaptive selection of rate-distortion points.
+
+Fixed sweep of CRF/QP encodes many points outside of useful quality range.
+Adaptive_sweep encodes only few probe points of every series, fits quality as
+function of the rate control parameter and chooses the remaining values, so
+the points are evenly spaced in quality inside the target interval.
+Target_sweep searches the parameter which hits given bitrates or qualities,
+e.g. for matched-rate tables. transcode_pruned() encodes edges of existing
+sweeps first and skips values which don't change the RD curve. Every trial
+is logged to CSV.
+
+Usage:
+    crf = rd_search.Adaptive_sweep(10, 51, 6, target=(33, 45))
+    transcode_set = enc.Transcode_setting("ffmpeg_transcode.py", "ffmpeg",
+                                          [["-c:v", "libx265", "-crf", crf]])
+    rd_search.transcode_adaptive(binaries, inputfiles, {"x265": transcode_set},
+                                 outputpath)
+
+    crf = rd_search.Target_sweep(10, 51, [1000, 3000, 6000], kind="bitrate")
+    # transcode_set with "-crf", crf in options
+    rd_search.transcode_target(binaries, inputfiles, {"x265": transcode_set},
+                               outputpath)
+
+    # transcode_set with "-crf", enc.sweep_param("add", 10, 51, 1)
+    rd_search.transcode_pruned(binaries, inputfiles, {"x265": transcode_set},
+                               outputpath, window=(30, 50))
+"""
+import os
+import re
+import abc
+import math
+import time
+import threading
+import subprocess
+import concurrent.futures as cf
+import numpy as np
+import encoders_comparison_tool as enc
+import video_info
+
+
+psnr_log_suffix = "-psnr_logfile.txt"
+# PSNR of identical frames is infinite, it is counted as this value.
+PSNR_MAX = 100.0
+
+
+def _escape_filter_path(path):
+    return path.replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
+
+
+def read_psnr_log(logfile):
+    """ Average psnr_avg of frames in stats file of ffmpeg psnr filter. """
+    with open(logfile, 'r') as log:
+        values = [float(v) for v in re.findall(r"psnr_avg:(\S+)", log.read())]
+    if not values:
+        raise ValueError(f"No PSNR values in {logfile}")
+    return float(np.mean(np.minimum(values, PSNR_MAX)))
+
+
+def psnr(job):
+    """ Quality metric, average PSNR of job's output against its input.
+
+    Stats of frames are written to "<output>-psnr_logfile.txt" like by
+    run_vqa.py, so generate_plots can use them. Log which is newer than the
+    output is reused.
+
+    Returns: PSNR in dB.
+    """
+    distorted = job.outputfile if os.path.isfile(job.outputfile) else job.encodedfile
+    logfile = job.basename + psnr_log_suffix
+    if not (os.path.isfile(logfile) and os.path.getmtime(logfile) >= os.path.getmtime(distorted)):
+        result = subprocess.run(
+            [job.binaries["ffmpeg"], "-v", "error", "-nostdin",
+             "-i", distorted, "-i", job.inputfile,
+             "-lavfi", f"[0:v][1:v]psnr=stats_file={_escape_filter_path(logfile)}",
+             "-f", "null", "-"],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise ValueError(result.stderr.rstrip("\n"))
+    return read_psnr_log(logfile)
+
+
+def bitrate(job):
+    """ Measure of finished job, average bitrate of its video stream.
+
+    Uses packet index of the encoded file, see video_info.video_stream_size().
+
+    Returns: Bitrate in kbit/s.
+    """
+    size = video_info.video_stream_size(job.encodedfile)  # KiB
+    return size * 1024 * 8 / 1000 / video_info.video_length_seconds(job.inputfile)
+
+
+class Rd_sweep(enc.sweep_param, abc.ABC):
+    """ Base of sweeps whose values are chosen from measured results.
+
+    Values are numbers, self() formats them like sweep() does.
+
+    class functions:
+        self(): Numpy array with formatted values, like sweep_param.
+        parse(value): Number from formatted value.
+        next_values(points): Choose new values from measured points, empty
+            list when the series is done.
+    """
+
+    def __init__(self, mode, start, stop, n, step=1, prefix="", suffix="", separate=False):
+        super().__init__(mode, start, stop, n, prefix, suffix, separate)
+        self.step = step
+        self.values = np.array([])
+
+    def __call__(self):
+        return self.format(self.values)
+
+    def edge(self):
+        values = self()
+        return values[0], values[-1]
+
+    def round(self, values):
+        values = np.clip(np.asarray(values, dtype=float),
+                         min(self.start, self.stop), max(self.start, self.stop))
+        if self.step is not None:
+            values = np.round((values - self.start) / self.step) * self.step + self.start
+        return np.unique(values)
+
+    def format(self, values):
+        values = np.asarray(values, dtype=float)
+        integer = self.step is not None and float(self.step).is_integer() and float(self.start).is_integer()
+        if integer:
+            values = np.char.mod('%d', values.astype(np.int64))
+        else:
+            values = np.char.mod('%.3f', values)
+        values = np.char.add(self.prefix, values)
+        return np.char.add(values, self.suffix)
+
+    def parse(self, value):
+        value = str(value)
+        return float(value[len(self.prefix):len(value) - len(self.suffix)])
+
+    @abc.abstractmethod
+    def next_values(self, points):
+        """ Choose new values from measured points.
+
+        Args:
+            points: Dictionary of measures, key is value of parameter.
+
+        Returns: Sorted list of new values, empty when the series is done.
+        """
+
+
+class Adaptive_sweep(Rd_sweep):
+    """ Sweep of rate control parameter chosen by measured quality.
+
+    When used in plain transcode() only probe values are encoded, the rest is
+    chosen by transcode_adaptive().
+
+    Attributes:
+        start: Lowest value of parameter, e.g. CRF 10.
+        stop: Highest value of parameter, e.g. CRF 51.
+        n: Budget, number of encoded points of every series.
+        target: Tuple (low, high) of quality interval which is covered.
+        probes: Number of points encoded before the fit, evenly spaced inside
+            start and stop.
+        step: Values are rounded to multiples of step from start, None for
+            continuous parameter.
+        prefix, suffix, separate: Same as of sweep_param.
+    """
+
+    def __init__(self, start, stop, n, target, probes=3, step=1, prefix="", suffix="", separate=False):
+        super().__init__("adaptive", start, stop, n, step, prefix, suffix, separate)
+        self.target = (min(target), max(target))
+        self.probes = min(probes, n)
+        self.values = self.round(np.linspace(start, stop, self.probes + 2)[1:-1])
+
+    def next_values(self, points, budget=None):
+        """ Choose new values which fill target quality interval evenly.
+
+        Quality is interpolated between measured points and linearly
+        extrapolated outside of them. Targets are n qualities evenly spread
+        in target interval, the one farthest from all measured and chosen
+        points is taken first.
+
+        Args:
+            points: Dictionary of measured quality, key is value of parameter.
+            budget: Maximal number of new values, by default rest of n.
+
+        Returns: Sorted list of new values, empty if interval is covered.
+        """
+        if budget is None:
+            budget = self.n - len(points)
+        if len(points) < 2 or budget <= 0:
+            return []
+        params = np.array(list(points.keys()), dtype=float)
+        qualities = np.array(list(points.values()), dtype=float)
+        order = np.argsort(qualities)
+        q_sorted, p_sorted = qualities[order], params[order]
+        slope, intercept = np.polyfit(qualities, params, 1)
+        low, high = self.target
+        targets = np.linspace(low, high, max(self.n, 2))
+        spacing = (high - low) / (len(targets) - 1)
+        covered = list(qualities)
+        new = []
+        while len(new) < budget:
+            distances = np.array([min(abs(t - c) for c in covered) for t in targets])
+            i = int(np.argmax(distances))
+            if distances[i] < spacing / 2:
+                break
+            covered.append(targets[i])
+            if q_sorted[0] <= targets[i] <= q_sorted[-1]:
+                param = np.interp(targets[i], q_sorted, p_sorted)
+            else:
+                param = slope * targets[i] + intercept
+            param = float(self.round([param])[0])
+            if param not in points and param not in new:
+                new.append(param)
+        return sorted(new)
+
+
+class Target_sweep(Rd_sweep):
+    """ Rate control parameter searched for every target bitrate or quality.
+
+    Search is bisection with secant steps, measured values of all trials of
+    the series are reused for every target. Bitrate is interpolated in log
+    domain.
+
+    Attributes:
+        start, stop: Bounds of parameter, e.g. CRF 10 and 51.
+        targets: List of target bitrates in kbit/s or qualities.
+        kind: "bitrate" or "quality".
+        tolerance: Relative difference from target which is accepted.
+        max_trials: Maximal number of encodes of series per target.
+        increasing: True if measured value grows with parameter (e.g. -b:v),
+            False for CRF or QP.
+        step: Values are rounded to multiples of step from start, None for
+            continuous parameter.
+        prefix, suffix, separate: Same as of sweep_param.
+    """
+
+    def __init__(self, start, stop, targets, kind="bitrate", tolerance=0.02, max_trials=8, increasing=False,
+                 step=1, prefix="", suffix="", separate=False):
+        super().__init__("target", start, stop, len(targets), step, prefix, suffix, separate)
+        if kind not in ("bitrate", "quality"):
+            raise ValueError("Target_sweep kind can only be 'bitrate' or 'quality'.")
+        self.targets = sorted(targets)
+        self.kind = kind
+        self.tolerance = tolerance
+        self.max_trials = max_trials
+        self.increasing = increasing
+        self.values = self.round([(start + stop) / 2])
+
+    def _transform(self, values):
+        values = np.asarray(values, dtype=float)
+        return np.log(np.maximum(values, 1e-9)) if self.kind == "bitrate" else values
+
+    def best(self, points, target):
+        """ Trial closest to target, tuple (value, measured). """
+        value = min(points, key=lambda p: abs(points[p] - target))
+        return value, points[value]
+
+    def _secant(self, p0, p1, points, target):
+        f0, f1, ft = self._transform([points[p0], points[p1], target])
+        if f0 == f1:
+            return (p0 + p1) / 2
+        return p0 + (ft - f0) * (p1 - p0) / (f1 - f0)
+
+    def _next_for_target(self, points, target):
+        if abs(self.best(points, target)[1] / target - 1) <= self.tolerance:
+            return None
+        above = [p for p in points if points[p] > target]
+        below = [p for p in points if points[p] < target]
+        if above and below:
+            p0, p1 = min(((a, b) for a in above for b in below), key=lambda ab: abs(ab[0] - ab[1]))
+            if self.step is not None and abs(p1 - p0) <= self.step:
+                return None  # no value between bracket ends
+            value = float(self.round([self._secant(p0, p1, points, target)])[0])
+            if value in points:
+                if self.step is None:
+                    value = (p0 + p1) / 2
+                else:
+                    # Secant stuck on bracket end, target is next to it.
+                    other = p1 if value == p0 else p0
+                    value = float(value + np.sign(other - value) * self.step)
+        elif len(points) >= 2:
+            p0, p1 = sorted(points, key=lambda p: abs(points[p] - target))[:2]
+            value = float(self.round([self._secant(p0, p1, points, target)])[0])
+        else:
+            p0 = next(iter(points))
+            higher = (points[p0] < target) == self.increasing
+            bound = max(self.start, self.stop) if higher else min(self.start, self.stop)
+            value = float(self.round([(p0 + bound) / 2])[0])
+        if value in points:
+            return None  # bracket is narrower than step
+        return value
+
+    def next_values(self, points):
+        """ Choose next trial for every target which isn't hit yet.
+
+        Args:
+            points: Dictionary of measured values, key is value of parameter.
+
+        Returns: Sorted list of new values, empty if search ended.
+        """
+        if not points or len(points) >= self.max_trials * len(self.targets):
+            return []
+        new = set()
+        for target in self.targets:
+            value = self._next_for_target(points, target)
+            if value is not None:
+                new.add(value)
+        return sorted(new)
+
+
+class Pruned_sweep(Rd_sweep):
+    """ Existing sweep encoded from its edges inwards, redundant points skipped.
+
+    Measured points are tuples (bitrate, quality). Interval between two
+    neighbouring encoded values is split by its middle value only if it
+    reaches into the target windows and RD curve isn't straight there, i.e.
+    quality of some point on its ends differs from line through its
+    neighbours in (log bitrate, quality) by more than tolerance.
+
+    Attributes:
+        sweep: sweep_param with numeric values, e.g. CRF sweep.
+        window: Optional tuple (low, high) of useful quality.
+        bitrate_window: Optional tuple (low, high) of useful bitrate in kbit/s.
+        tolerance: Quality difference from the interpolated curve which is
+            redundant, e.g. 0.2 dB of PSNR.
+    """
+
+    def __init__(self, sweep, window=None, bitrate_window=None, tolerance=0.2):
+        self.strings = [str(v) for v in sweep()]
+        super().__init__("pruned", 0, len(self.strings) - 1, len(self.strings), None,
+                         sweep.prefix if sweep.mode != "list" else "",
+                         sweep.suffix if sweep.mode != "list" else "", sweep.separate)
+        self.numbers = [self.parse(v) for v in self.strings]
+        self.window = window
+        self.bitrate_window = bitrate_window
+        self.tolerance = tolerance
+        self.values = np.array(sorted({self.numbers[0], self.numbers[-1]}))
+
+    def format(self, values):
+        return np.array([self.strings[self.numbers.index(v)] for v in values])
+
+    def _outside(self, a, b):
+        """ Both ends are on same side out of a window. """
+        for window, i in ((self.window, 1), (self.bitrate_window, 0)):
+            if window is None:
+                continue
+            if (a[i] < window[0] and b[i] < window[0]) or (a[i] > window[1] and b[i] > window[1]):
+                return True
+        return False
+
+    def _deviation(self, a, b, c):
+        """ Quality difference of b from line through a and c. """
+        xa, xb, xc = np.log(np.maximum([a[0], b[0], c[0]], 1e-9))
+        if xa == xc:
+            return abs(b[1] - (a[1] + c[1]) / 2)
+        return abs(b[1] - (a[1] + (xb - xa) * (c[1] - a[1]) / (xc - xa)))
+
+    def next_values(self, points):
+        """ Choose middle values of intervals which need refinement.
+
+        Args:
+            points: Dictionary of measured (bitrate, quality), key is value of
+                parameter.
+
+        Returns: Sorted list of new values, empty if curve is resolved.
+        """
+        encoded = sorted(self.numbers.index(v) for v in points)
+        if len(encoded) < 2:
+            return []
+        measured = [points[self.numbers[i]] for i in encoded]
+        curved = [False] * (len(encoded) - 1)  # interval needs refinement
+        if len(encoded) == 2:
+            curved[0] = True
+        for k in range(1, len(encoded) - 1):
+            if self._deviation(measured[k - 1], measured[k], measured[k + 1]) > self.tolerance:
+                curved[k - 1] = curved[k] = True
+        new = []
+        for k, needed in enumerate(curved):
+            i, j = encoded[k], encoded[k + 1]
+            if needed and j - i > 1 and not self._outside(measured[k], measured[k + 1]):
+                new.append(self.numbers[(i + j) // 2])
+        return sorted(new)
+
+
+def _rd_sweep_pos(transcode_set, sweep_class):
+    params = [pos for pos in transcode_set.param_find()[1]
+              if isinstance(transcode_set.options_flat()[pos], sweep_class)]
+    if len(params) != 1:
+        raise ValueError(f"Transcode_setting needs exactly one {sweep_class.__name__}.")
+    return params[0]
+
+
+def _transcode_rounds(binaries_ent, videofiles, transcode_sets, output_path, sweep_class, metric,
+                      max_rounds, trials_log, **kwargs):
+    """ Transcode in rounds, values of next round are chosen by sweeps.
+
+    Series is input file with values of other sweep_params. Every finished
+    job is measured by metric and logged to trials_log, then next_values() of
+    the sweep chooses values of the series for the next round. Jobs finished
+    in previous run are only measured, measures are cached by metric. Failed
+    jobs and unknown measures are missing points, their values aren't tried
+    again.
+
+    Returns: Dictionary of series, key is tuple (setting name, input file,
+        values of other sweeps), value is dictionary of measured values, key
+        is value of the swept parameter.
+    """
+    videofiles = list(videofiles)
+    origin = {ts: (name, _rd_sweep_pos(ts, sweep_class)) for name, ts in transcode_sets.items()}
+    series = {}
+    failed = {}  # key is series, value is set of failed values
+    ended = []
+    failed_jobs = []
+    lock = threading.Lock()
+    if trials_log is None:
+        trials_log = os.path.join(output_path, "rd_trials.csv")
+    enc.create_dir(os.path.dirname(trials_log) or ".")
+    if not os.path.isfile(trials_log):
+        with open(trials_log, 'w') as log:
+            log.write("time,setting,inputfile,series,value,measure,encodedfile\n")
+
+    def job_done(job, exception):
+        with lock:
+            if exception is None:
+                ended.append(job)
+            else:
+                failed_jobs.append(job)
+
+    def series_value(job):
+        """ Series key and value of the swept parameter of job. """
+        name, pos = origin[job.transcode_set]
+        fixed = tuple(str(job.args[p]) for p in job.transcode_set.param_find()[1] if p != pos)
+        sweep = transcode_sets[name].options_flat()[pos]
+        return (name, job.inputfile, fixed), sweep.parse(job.args[pos])
+
+    def measure(job):
+        try:
+            return metric(job)
+        except (ValueError, OSError) as e:
+            print(f"{enc.bcolors.WARNING}Measure of {job.outputfile} unknown: {e}{enc.bcolors.ENDC}")
+            return None
+
+    round_sets = transcode_sets
+    for round_num in range(max_rounds):
+        ended.clear()
+        failed_jobs.clear()
+        enc.transcode_batch(binaries_ent, videofiles, round_sets, output_path, job_done=job_done, **kwargs)
+        with cf.ThreadPoolExecutor() as executor:
+            measures = list(executor.map(measure, ended))
+        with open(trials_log, 'a') as log:
+            for job, measured in zip(ended + failed_jobs, measures + ["failed"] * len(failed_jobs)):
+                key, value = series_value(job)
+                name, inputfile, fixed = key
+                if measured is None or measured == "failed":
+                    failed.setdefault(key, set()).add(value)
+                    measured_str = measured or "unknown"
+                else:
+                    series.setdefault(key, {})[value] = measured
+                    measured_str = " ".join(str(m) for m in measured) if isinstance(measured, tuple) else measured
+                log.write(f"{time.time()},{name},{inputfile},{' '.join(fixed)},{value},{measured_str},{job.encodedfile}\n")
+
+        round_sets = {}
+        for (name, inputfile, fixed), points in series.items():
+            transcode_set = transcode_sets[name]
+            pos = origin[transcode_set][1]
+            sweep = transcode_set.options_flat()[pos]
+            values = [v for v in sweep.next_values(points) if v not in failed.get((name, inputfile, fixed), ())]
+            if not values:
+                continue
+            print(f"{name} {inputfile} {' '.join(fixed)}: next values {values}")
+            # Same options with values of this series, so outputs are named
+            # as in the first round.
+            flat = transcode_set.options_flat()
+            fixed_values = iter(fixed)
+            for p in transcode_set.param_find()[1]:
+                if p == pos:
+                    flat[p] = enc.sweep_param("list", list(sweep.format(values)), separate=sweep.separate)
+                else:
+                    flat[p] = enc.sweep_param("list", [next(fixed_values)], separate=flat[p].separate)
+            series_set = enc.Transcode_setting(transcode_set.transcode_plugin, transcode_set.binary, [flat],
+                                               **{**transcode_set.kwargs, "videofiles": [inputfile]})
+            origin[series_set] = (name, pos)
+            round_sets[f"{name} {len(round_sets)}"] = series_set
+        if not round_sets:
+            break
+    return series
+
+
+def transcode_adaptive(binaries_ent, videofiles, transcode_sets, output_path, metric=psnr, max_rounds=3,
+                       trials_log=None, **kwargs):
+    """ Transcode with points of Adaptive_sweep chosen by measured quality.
+
+    First round encodes probe values of every series (input file and values
+    of other sweep_params), next rounds encode values chosen by
+    Adaptive_sweep.next_values() until budget is used or the target interval
+    is covered.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path.
+        videofiles: Iterable containing path to video files.
+        transcode_sets: Dictionary of Transcode_setting objects, each with one
+            Adaptive_sweep.
+        output_path: Path to folder where transcoded videos will be outputed.
+        metric: Function metric(job) returning quality of finished job,
+            higher is better.
+        max_rounds: Maximal number of transcode rounds.
+        trials_log: Path to CSV with every measured job, by default
+            "rd_trials.csv" in output_path.
+        kwargs: Passed to transcode_batch().
+
+    Returns: Dictionary, key is tuple (setting name, input file, values of
+        other sweeps), value is sorted list of tuples (value, quality).
+    """
+    series = _transcode_rounds(binaries_ent, videofiles, transcode_sets, output_path, Adaptive_sweep,
+                               metric, max_rounds, trials_log, **kwargs)
+    return {key: sorted(points.items()) for key, points in series.items()}
+
+
+def transcode_target(binaries_ent, videofiles, transcode_sets, output_path, metric=psnr, max_rounds=10,
+                     trials_log=None, **kwargs):
+    """ Search parameter of Target_sweep hitting every target of every series.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path.
+        videofiles: Iterable containing path to video files.
+        transcode_sets: Dictionary of Transcode_setting objects, each with one
+            Target_sweep.
+        output_path: Path to folder where transcoded videos will be outputed.
+        metric: Function metric(job) returning quality of finished job, used
+            for Target_sweep of kind "quality".
+        max_rounds: Maximal number of transcode rounds.
+        trials_log: Path to CSV with every trial, by default "rd_trials.csv"
+            in output_path.
+        kwargs: Passed to transcode_batch().
+
+    Returns: Dictionary, key is tuple (setting name, input file, values of
+        other sweeps), value is dictionary with tuple (value, measured) of
+        closest trial for every target.
+    """
+    kinds = {transcode_set.options_flat()[_rd_sweep_pos(transcode_set, Target_sweep)].kind
+             for transcode_set in transcode_sets.values()}
+    if len(kinds) != 1:
+        raise ValueError("All Target_sweep of one transcode_target() call must be of same kind.")
+    series = _transcode_rounds(binaries_ent, videofiles, transcode_sets, output_path, Target_sweep,
+                               bitrate if kinds == {"bitrate"} else metric, max_rounds, trials_log, **kwargs)
+    results = {}
+    for (name, inputfile, fixed), points in series.items():
+        transcode_set = transcode_sets[name]
+        sweep = transcode_set.options_flat()[_rd_sweep_pos(transcode_set, Target_sweep)]
+        results[(name, inputfile, fixed)] = {target: sweep.best(points, target) for target in sweep.targets}
+    return results
+
+
+def transcode_pruned(binaries_ent, videofiles, transcode_sets, output_path, metric=psnr, window=None,
+                     bitrate_window=None, tolerance=0.2, rd_param=None, max_rounds=None, trials_log=None,
+                     **kwargs):
+    """ Encode edge values of rate control sweep first, then only useful ones.
+
+    Sweep at rd_param of every setting is replaced by Pruned_sweep, other
+    sweeps make series which are pruned separately. Outputs are named same
+    as in full sweep, so results of full runs are reused.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path.
+        videofiles: Iterable containing path to video files.
+        transcode_sets: Dictionary of Transcode_setting objects.
+        output_path: Path to folder where transcoded videos will be outputed.
+        metric: Function metric(job) returning quality of finished job.
+        window: Optional tuple (low, high) of useful quality.
+        bitrate_window: Optional tuple (low, high) of useful bitrate in kbit/s.
+        tolerance: Quality difference from interpolated RD curve which is
+            redundant.
+        rd_param: Position of the pruned sweep_param in options_flat(), by
+            default the last sweep_param not in 'list' mode.
+        max_rounds: Maximal number of transcode rounds, by default enough to
+            reach every value.
+        trials_log: Path to CSV with every measured job, by default
+            "rd_trials.csv" in output_path.
+        kwargs: Passed to transcode_batch().
+
+    Returns: Dictionary, key is tuple (setting name, input file, values of
+        other sweeps), value is sorted list of tuples (value, bitrate,
+        quality) of encoded points.
+    """
+    pruned_sets = {}
+    for name, transcode_set in transcode_sets.items():
+        flat = transcode_set.options_flat()
+        pos = rd_param
+        if pos is None:
+            numeric = [p for p in transcode_set.param_find()[1] if flat[p].mode != "list"]
+            if not numeric:
+                raise ValueError(f"Transcode_setting {name} has no numeric sweep_param to prune.")
+            pos = numeric[-1]
+        transcode_set.is_pos_param(pos)
+        flat[pos] = Pruned_sweep(flat[pos], window, bitrate_window, tolerance)
+        pruned_sets[name] = enc.Transcode_setting(transcode_set.transcode_plugin, transcode_set.binary,
+                                                  [flat], **transcode_set.kwargs)
+    if max_rounds is None:
+        longest = max(len(ts.options_flat()[_rd_sweep_pos(ts, Pruned_sweep)].strings)
+                      for ts in pruned_sets.values())
+        max_rounds = math.ceil(math.log2(max(longest - 1, 1))) + 1
+
+    def measure(job):
+        return bitrate(job), metric(job)
+
+    series = _transcode_rounds(binaries_ent, videofiles, pruned_sets, output_path, Pruned_sweep,
+                               measure, max_rounds, trials_log, **kwargs)
+    results = {}
+    for (name, inputfile, fixed), points in series.items():
+        sweep = pruned_sets[name].options_flat()[_rd_sweep_pos(pruned_sets[name], Pruned_sweep)]
+        print(f"{name} {inputfile} {' '.join(fixed)}: encoded {len(points)} of {sweep.n} values")
+        results[(name, inputfile, fixed)] = sorted((value, *measured) for value, measured in points.items())
+    return results
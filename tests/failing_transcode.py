@@ -0,0 +1,27 @@
+""" Transcode plugin for tests, fails for some values of its options.
+
+Output file contains the options, job fails when one of the options is in
+job.kwargs["fail_values"].
+"""
+OUTPUT_UNSUPORTED_BY_FFMPEG = False
+INPUT_FILE_TYPE = ("mkv", "yuv", "y4m")
+OUTPUT_FILE_TYPE = "mkv"
+
+
+# Start transcode
+def transcode_start(job):
+    args = [str(a).strip() for a in job.args]
+    if any(a in job.kwargs.get("fail_values", ()) for a in args):
+        raise ValueError(f"Encoder failed with {' '.join(args)}")
+    with open(job.outputfile, 'w') as f:
+        f.write(" ".join(args))
+    return job.job_id, 0
+
+
+def get_input_variant(job):
+    pass
+
+
+# Test if configuration works
+def transcode_check_arguments(binpath, filename, args, binaries, mode="quick"):
+    return 0
@@ -0,0 +1,71 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import encoders_comparison_tool as enc  # noqa: E402
+import distributed  # noqa: E402
+
+PLUGIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "failing_transcode.py")
+
+
+class Local_cluster_test(unittest.TestCase):
+    """ Coordinator and two worker agents on localhost. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.videofile = os.path.join(self.tmp, "in.y4m")
+        with open(self.videofile, 'wb') as f:
+            f.write(b"YUV4MPEG2 W16 H16 F25:1 Ip A1:1 C420jpeg\n")
+            for _ in range(2):
+                f.write(b"FRAME\n" + bytes(16 * 16 * 3 // 2))
+        self.output_path = os.path.join(self.tmp, "out") + "/"
+        self.address = os.path.join(self.tmp, "ect.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_jobs_on_two_workers(self):
+        transcode_set = enc.Transcode_setting(PLUGIN, "encoder", [["-qp", enc.sweep_param("list", ["20", "30", "40", "50"])]])
+        coordinator = distributed.Coordinator({}, [self.videofile], {"set": transcode_set}, self.output_path,
+                                              self.address, b"secret", fail_values=("30",))
+        results = []
+        server = threading.Thread(target=lambda: results.extend(coordinator.serve()), daemon=True)
+        server.start()
+        while server.is_alive() and not os.path.exists(self.address):
+            server.join(0.05)
+        workers = [subprocess.Popen([sys.executable, os.path.join(ROOT, "distributed.py"),
+                                     "--address", self.address, "--authkey", "secret"],
+                                    cwd=self.tmp, stdout=subprocess.DEVNULL)
+                   for _ in range(2)]
+        for worker in workers:
+            self.assertEqual(worker.wait(timeout=60), 0)
+        server.join(10)
+        self.assertFalse(server.is_alive())
+        self.assertEqual(sorted(r["job_id"] for r in results), [0, 1, 2, 3])
+        for result in results:
+            failed = result["args"][-1] == "30"
+            self.assertEqual(result["error"] is not None, failed)
+            if not failed:
+                self.assertTrue(os.path.isfile(os.path.join(self.output_path, f"in-qp_{result['args'][-1]}.mkv")))
+            self.assertTrue(os.path.isfile(os.path.join(self.output_path, result["useage_logfile"])))
+
+    def test_log_outside_output_path(self):
+        coordinator = distributed.Coordinator({}, [], {}, self.output_path, self.address, b"secret")
+        self.assertEqual(coordinator._log_path("in-qp_20_useage.log"),
+                         os.path.join(self.output_path, "in-qp_20_useage.log"))
+        for relpath in ("../escaped.log", "sub/../../escaped.log", os.path.join(self.tmp, "escaped.log")):
+            self.assertIsNone(coordinator._log_path(relpath))
+        coordinator.unfinished = 1
+        coordinator._store_result({"job_id": 0}, {"logs": {"../escaped.log": "x"}, "worker": "w",
+                                                  "returncode": 0, "error": None})
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "escaped.log")))
+
+
+if __name__ == '__main__':
+    unittest.main()
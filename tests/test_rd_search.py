@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import encoders_comparison_tool as enc  # noqa: E402
+import rd_search  # noqa: E402
+
+PLUGIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "failing_transcode.py")
+
+
+def qp_metric(job):
+    """ Quality falling with QP, parsed from output of failing_transcode. """
+    with open(job.outputfile, 'r') as f:
+        return 60.0 - float(f.read().split()[-1])
+
+
+class Failed_trials_test(unittest.TestCase):
+    """ Search of rd_search skips failed trials and finishes. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.videofile = os.path.join(self.tmp, "in.y4m")
+        with open(self.videofile, 'wb') as f:
+            f.write(b"YUV4MPEG2 W16 H16 F25:1 Ip A1:1 C420jpeg\n")
+            for _ in range(2):
+                f.write(b"FRAME\n" + bytes(16 * 16 * 3 // 2))
+        self.output_path = os.path.join(self.tmp, "out") + "/"
+        self.binaries = {"ffprobe": "ffprobe", "ffmpeg": "ffmpeg"}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def run_search(self, search, sweep, **kwargs):
+        transcode_set = enc.Transcode_setting(PLUGIN, "encoder", [["-qp", sweep]])
+        return search(self.binaries, [self.videofile], {"set": transcode_set}, self.output_path, metric=qp_metric,
+                      render_status=False, fail_values=("30",), **kwargs)
+
+    def test_target(self):
+        # First trial is the middle value 30, which fails.
+        sweep = rd_search.Target_sweep(10, 50, [40, 20], kind="quality", tolerance=0.01)
+        self.assertEqual(self.run_search(rd_search.transcode_target, sweep), {})
+        with open(os.path.join(self.output_path, "rd_trials.csv"), 'r') as f:
+            self.assertIn(",30.0,failed,", f.read())
+
+    def test_adaptive(self):
+        sweep = rd_search.Adaptive_sweep(10, 50, 5, (25, 45))
+        results = self.run_search(rd_search.transcode_adaptive, sweep)
+        points = dict(next(iter(results.values())))
+        self.assertNotIn(30.0, points)
+        self.assertEqual(points[20.0], 40.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
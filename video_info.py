@@ -1,67 +1,318 @@
+import os
+import json
 import subprocess
+import functools
+import threading
+import collections
+import concurrent.futures as cf
+import numpy as np
+import bitstream_index
+import yuv_reader
+from probe_cache import Probe_cache
 
 
 binaries = {}
+# Persistent Probe_cache shared by processes, None if not used.
+cache = None
 # Videofiles properties. Key is video file path.
+videofiles_probe = {}
 videofiles_frame_num = {}
 videofiles_duration = {}
 videofiles_framerate = {}
 videofiles_resolution = {}
 videofiles_pix_fmt = {}
-pix_fmts_bpp = {}
+videofiles_packet_sizes = {}
+# Pixel format tables. Key is ffprobe path.
+pix_fmts = {}
+
+
+VideoInfo = collections.namedtuple(
+    "VideoInfo", ["path", "duration", "framerate_str", "framerate", "width",
+                  "height", "dimensions", "pix_fmt", "codec_name", "nb_frames",
+                  "bit_rate", "size"])
+Pix_fmt = collections.namedtuple(
+    "Pix_fmt", ["name", "nb_components", "log2_chroma_w", "log2_chroma_h",
+                "bits_per_pixel", "bit_depths", "planar", "rgb", "alpha",
+                "big_endian", "hwaccel", "bitstream"])
+Pix_fmt.__doc__ = """ Descriptor of pixel format from ffprobe -show_pixel_formats.
+
+    nb_components: Number of components, e.g. 3 for Y, U and V.
+    log2_chroma_w, log2_chroma_h: Chroma subsampling, e.g. 1 and 1 for 4:2:0.
+    bits_per_pixel: Average bits of one pixel without padding, 0 if unknown.
+    bit_depths: Tuple of bit depth of every component.
+    planar, rgb, alpha, big_endian, hwaccel, bitstream: Flags of format.
+"""
+
+
+VideoInfo.__doc__ = """ Properties of video file and its first video stream.
+
+    duration: Length of video in seconds.
+    framerate_str: Framerate as string "numerator/denominator".
+    framerate: Framerate as number.
+    width, height: Dimensions in pixels, dimensions: String "1920x1080".
+    pix_fmt: Pixel format in ffmpeg's format. (eg. "yuv420p10le")
+    codec_name: Codec of video stream.
+    nb_frames: Number of frames from stream header or None.
+    bit_rate: Bitrate of file in bit/s or None.
+    size: Size of file in bytes or None.
+"""
 
 
 def set_defaults(binaries_ent):
     global binaries
     binaries = {**binaries, **binaries_ent}
 
-# Functions for getting the video info.
-
 
-def video_length_seconds(videofile_path, binaries_ent=None):
-    """ Get length of video in seconds.
+def set_cache(path):
+    """ Use persistent probe cache in SQLite database, None disables it. """
+    global cache
+    cache = Probe_cache(path) if path else None
 
-    Args:
-        binaries_ent: Dictionary with binaries and their path.
-        videofile_path: Path to video file.
 
-    Returns: Length of video in seconds.
-    """
+def _binary_path(binaries_ent, name):
+    """ Get path of binary from binaries_ent, or from defaults if None. """
     if binaries_ent is None:
         global binaries
-        ffprobepath = binaries["ffprobe"]
+        return binaries[name]
     elif type(binaries_ent) == str:
-        ffprobepath = binaries_ent
+        return binaries_ent
     elif type(binaries_ent) == dict:
-        ffprobepath = binaries_ent["ffprobe"]
+        return binaries_ent[name]
     else:
         raise TypeError(
             "Passed binary can only be in format string or dictionary")
 
-    global videofiles_duration
+
+_single_flight_lock = threading.Lock()
+
+
+def _single_flight(func):
+    """ Run func only once at time for same first argument.
+
+    Concurrent callers with the same key wait for result of the running call
+    instead of starting their own ffprobe. Function has to look into its
+    cache first, so callers coming after the result was stored don't repeat
+    the work.
+    """
+    running = {}
+
+    @functools.wraps(func)
+    def wrapper(key, *args, **kwargs):
+        with _single_flight_lock:
+            future = running.get(key)
+            owner = future is None
+            if owner:
+                future = running[key] = cf.Future()
+        if not owner:
+            return future.result()
+        try:
+            result = func(key, *args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with _single_flight_lock:
+                del running[key]
+    return wrapper
+
+
+# Functions for getting the video info.
+
+
+@_single_flight
+def probe(videofile_path, binaries_ent=None):
+    """ Get all format and stream properties of video with one ffprobe call.
+
+    Fills caches of all video_* functions.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+        videofile_path: Path to video file.
+
+    Returns: Dictionary with "format" and "streams" from ffprobe's JSON.
+    """
     try:
-        duration = videofiles_duration[videofile_path]
-        return duration
+        return videofiles_probe[videofile_path]
     except KeyError:
-        result = subprocess.run(
-            [
-                ffprobepath,
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                videofile_path,
-            ],
-            capture_output=True,
-            text=True,
-        )
+        pass
+    if cache is not None:
         try:
-            videofiles_duration[videofile_path] = float(result.stdout)
-            return float(result.stdout)
-        except ValueError:
-            raise ValueError(result.stderr.rstrip("\n"))
+            info = cache.get(videofile_path, "probe")
+            _fill_caches(videofile_path, info)
+            return info
+        except KeyError:
+            pass
+    if videofile_path.endswith(".y4m"):
+        # header has everything, no need to start ffprobe
+        info = _probe_y4m(videofile_path)
+        _fill_caches(videofile_path, info)
+        return info
+    result = subprocess.run(
+        [
+            _binary_path(binaries_ent, "ffprobe"),
+            "-v",
+            "error",
+            "-show_format",
+            "-show_streams",
+            "-of",
+            "json",
+            videofile_path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    try:
+        info = json.loads(result.stdout)
+        info["format"]
+    except (ValueError, KeyError):
+        raise ValueError(result.stderr.rstrip("\n"))
+    if cache is not None:
+        cache.put(videofile_path, "probe", info)
+    _fill_caches(videofile_path, info)
+    return info
+
+
+def _probe_y4m(videofile_path):
+    """ Make same structure as ffprobe's JSON from Y4M header. """
+    with yuv_reader.Yuv_file(videofile_path) as video:
+        stream = {
+            "index": 0,
+            "codec_name": "rawvideo",
+            "codec_type": "video",
+            "width": video.width,
+            "height": video.height,
+            "pix_fmt": video.pix_fmt,
+            "r_frame_rate": video.framerate_str,
+            "avg_frame_rate": video.framerate_str,
+            "nb_frames": str(video.frames),
+        }
+        fmt = {
+            "filename": videofile_path,
+            "format_name": "yuv4mpegpipe",
+            "size": str(os.path.getsize(videofile_path)),
+        }
+        if video.framerate:
+            fmt["duration"] = f"{video.duration:.6f}"
+            fmt["bit_rate"] = str(int(int(fmt["size"]) * 8 / video.duration))
+    return {"streams": [stream], "format": fmt}
+
+
+def _video_stream(info):
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            return stream
+    return {}
+
+
+def _fill_caches(videofile_path, info):
+    stream = _video_stream(info)
+    if "duration" in info["format"]:
+        videofiles_duration[videofile_path] = float(info["format"]["duration"])
+    if "r_frame_rate" in stream:
+        videofiles_framerate[videofile_path] = stream["r_frame_rate"]
+    if "width" in stream and "height" in stream:
+        videofiles_resolution[videofile_path] = f"{stream['width']}x{stream['height']}"
+    if "pix_fmt" in stream:
+        videofiles_pix_fmt[videofile_path] = stream["pix_fmt"]
+    # last, other threads take it as sign that all caches are filled
+    videofiles_probe[videofile_path] = info
+
+
+def _probed(cache, videofile_path, binaries_ent, stderr_msg):
+    """ Get value from cache, probe the video if it is not there. """
+    try:
+        return cache[videofile_path]
+    except KeyError:
+        probe(videofile_path, binaries_ent)
+    try:
+        return cache[videofile_path]
+    except KeyError:
+        raise ValueError(f"{videofile_path}: {stderr_msg}")
+
+
+def video_get_info(videofile_path, binaries_ent=None):
+    """ Get properties of video.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+        videofile_path: Path to video file.
+
+    Returns: VideoInfo record.
+    """
+    info = probe(videofile_path, binaries_ent)
+    stream = _video_stream(info)
+    fmt = info["format"]
+    framerate_str = stream.get("r_frame_rate")
+    framerate = None
+    if framerate_str and int(framerate_str.split("/")[1]) != 0:
+        framerate = int(framerate_str.split("/")[0]) / int(framerate_str.split("/")[1])
+    width = stream.get("width")
+    height = stream.get("height")
+    return VideoInfo(
+        path=videofile_path,
+        duration=float(fmt["duration"]) if "duration" in fmt else None,
+        framerate_str=framerate_str,
+        framerate=framerate,
+        width=width,
+        height=height,
+        dimensions=f"{width}x{height}" if width and height else None,
+        pix_fmt=stream.get("pix_fmt"),
+        codec_name=stream.get("codec_name"),
+        nb_frames=int(stream["nb_frames"]) if "nb_frames" in stream else None,
+        bit_rate=int(fmt["bit_rate"]) if "bit_rate" in fmt else None,
+        size=int(fmt["size"]) if "size" in fmt else None,
+    )
+
+
+def probe_many(videofile_paths, binaries_ent=None, max_workers=None, raise_errors=True):
+    """ Probe many videos in parallel.
+
+    Probes run on bounded pool of threads and share the caches, files which
+    are in persistent cache aren't probed again.
+
+    Args:
+        videofile_paths: Iterable containing path to video files.
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+        max_workers: Number of concurrent probes, by default number of processors.
+        raise_errors: Raise first error, if False failed videos are None.
+
+    Returns: Dictionary of VideoInfo records, key is video file path.
+    """
+    videofile_paths = list(dict.fromkeys(videofile_paths))
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    infos = {}
+    with cf.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe") as executor:
+        futures = {path: executor.submit(video_get_info, path, binaries_ent)
+                   for path in videofile_paths}
+        for path, future in futures.items():
+            try:
+                infos[path] = future.result()
+            except (ValueError, OSError) as e:
+                if raise_errors:
+                    raise
+                print(f"Probe of {path} failed: {e}")
+                infos[path] = None
+    return infos
+
+
+def video_length_seconds(videofile_path, binaries_ent=None):
+    """ Get length of video in seconds.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path.
+        videofile_path: Path to video file.
+
+    Returns: Length of video in seconds.
+    """
+    return _probed(videofiles_duration, videofile_path, binaries_ent,
+                   "no duration")
 
 
 def video_framerate_str(videofile_path, binaries_ent=None):
@@ -74,42 +325,8 @@ def video_framerate_str(videofile_path, binaries_ent=None):
 
     Returns: Framerate of video as string of "numerator/denominator".
     """
-    if binaries_ent is None:
-        global binaries
-        ffprobepath = binaries["ffprobe"]
-    elif type(binaries_ent) == str:
-        ffprobepath = binaries_ent
-    elif type(binaries_ent) == dict:
-        ffprobepath = binaries_ent["ffprobe"]
-    else:
-        raise TypeError(
-            "Passed binary can only be in format string or dictionary")
-
-    global videofiles_framerate
-    try:
-        framerate_str = videofiles_framerate[videofile_path]
-        return framerate_str
-    except KeyError:
-        result = subprocess.run(
-            [
-                ffprobepath,
-                "-v",
-                "error",
-                "-show_entries",
-                "stream=r_frame_rate",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                videofile_path,
-            ],
-            capture_output=True,
-            text=True,
-        )
-        try:
-            framerate_str = str(result.stdout.split("\n")[0])
-            videofiles_framerate[videofile_path] = framerate_str
-            return framerate_str
-        except ValueError:
-            raise ValueError(result.stderr.rstrip("\n"))
+    return _probed(videofiles_framerate, videofile_path, binaries_ent,
+                   "no video stream framerate")
 
 
 def video_framerate(videofile_path, binaries_ent=None):
@@ -122,73 +339,115 @@ def video_framerate(videofile_path, binaries_ent=None):
 
     Returns: Framerate of video as number.
     """
-    global videofiles_framerate
-    try:
-        framerate_str = videofiles_framerate[videofile_path]
-        framerate = int(framerate_str.split("/")[0]) / int(
-                framerate_str.split("/")[1])
-        return framerate
-    except KeyError:
-        framerate_str = video_framerate_str(videofile_path, binaries_ent=binaries_ent)
-        framerate = int(framerate_str.split("/")[0]) / int(
-            framerate_str.split("/")[1])
-        videofiles_framerate[videofile_path] = framerate_str
-        return framerate
+    framerate_str = video_framerate_str(videofile_path, binaries_ent=binaries_ent)
+    framerate = int(framerate_str.split("/")[0]) / int(
+        framerate_str.split("/")[1])
+    return framerate
+
 
+def _header_frames(info):
+    """ Number of frames written in stream header or tags, None if missing. """
+    stream = _video_stream(info)
+    if "nb_frames" in stream:
+        return int(stream["nb_frames"])
+    for tag, value in stream.get("tags", {}).items():
+        # Matroska statistics tags, e.g. NUMBER_OF_FRAMES-eng
+        if tag.upper().startswith("NUMBER_OF_FRAMES"):
+            return int(value)
+    return None
 
-def video_frames(videofile_path, binaries_ent=None):
-    """ Calculate number of frames of video.
+
+def video_frames(videofile_path, binaries_ent=None, exact=None):
+    """ Get number of frames of video.
+
+    Estimate is framerate * duration, which is wrong for VFR video and
+    rounded container durations. Exact count is number of packets from the
+    container index (see video_packet_sizes) or from Y4M file size.
 
     Args:
         binaries_ent: Dictionary with binaries and their path or string with path
                   to ffprobe.
         videofile_path: Path to video file.
+        exact: True counts packets, False returns estimate. None counts packets
+            only if stream header or framerate disagree with the estimate.
 
     Returns: Number of frames of video.
     """
-    return int(
-        video_framerate(videofile_path, binaries_ent) *
-        video_length_seconds(videofile_path, binaries_ent))
+    if exact is None:
+        try:
+            return videofiles_frame_num[videofile_path]
+        except KeyError:
+            pass
+    info = probe(videofile_path, binaries_ent)
+    frames_float = (video_framerate(videofile_path, binaries_ent) *
+                    video_length_seconds(videofile_path, binaries_ent))
+    estimate = int(frames_float)
+    if exact is False:
+        return estimate
+    header_frames = _header_frames(info)
+    if exact is None:
+        stream = _video_stream(info)
+        if header_frames is not None:
+            exact = header_frames != estimate
+        else:
+            vfr = stream.get("avg_frame_rate", stream.get("r_frame_rate")) != stream.get("r_frame_rate")
+            exact = vfr or abs(frames_float - round(frames_float)) > 0.01
+    if videofile_path.endswith(".y4m"):
+        frames = header_frames  # counted from file size
+    elif exact:
+        frames = len(video_packet_sizes(videofile_path, binaries_ent))
+    elif header_frames is not None:
+        frames = header_frames
+    else:
+        frames = estimate
+    videofiles_frame_num[videofile_path] = frames
+    return frames
 
 
-def video_stream_size(videofile_path, binaries_ent=None):
-    """ Get size of video in KB.
+@_single_flight
+def video_packet_sizes(videofile_path, binaries_ent=None):
+    """ Get sizes of packets of video stream.
+
+    IVF and Matroska files are indexed without reading frame data, see
+    bitstream_index.
 
     Args:
         binaries_ent: Dictionary with binaries and their path or string with path
-                  to ffmpeg.
+                  to ffprobe.
         videofile_path: Path to video file.
 
-    Returns: Size of stream in KB.
+    Returns: NumPy array with size of every packet in bytes, in file order.
     """
-    if binaries_ent is None:
-        global binaries
-        ffmpegpath = binaries["ffprobe"]
-    elif type(binaries_ent) == str:
-        ffmpegpath = binaries_ent
-    elif type(binaries_ent) == dict:
-        ffmpegpath = binaries_ent["ffmpeg"]
-    else:
-        raise TypeError(
-            "Passed binary can only be in format string or dictionary")
-
-    result = subprocess.run(
-        [
-            ffmpegpath,
-            "-hide_banner",
-            "-i", videofile_path,
-            "-map", "0:v:0",
-            "-c", "copy",
-            "-f", "null", "-"
-        ],
-        capture_output=True,
-        text=True,
-    )
     try:
-        size = (result.stderr.rsplit("\n")[-2].rsplit(" ")[0].rsplit(":")[1][0: -2])
-        return float(size)
-    except ValueError:
-        raise ValueError(result.stderr.rstrip("\n"))
+        return videofiles_packet_sizes[videofile_path]
+    except KeyError:
+        pass
+    sizes = None
+    if cache is not None:
+        try:
+            sizes = np.array(cache.get(videofile_path, "packet_sizes"), dtype=np.int64)
+        except KeyError:
+            pass
+    if sizes is None:
+        sizes = bitstream_index.packet_sizes(videofile_path,
+                                             _binary_path(binaries_ent, "ffprobe"))
+        if cache is not None:
+            cache.put(videofile_path, "packet_sizes", sizes.tolist())
+    videofiles_packet_sizes[videofile_path] = sizes
+    return sizes
+
+
+def video_stream_size(videofile_path, binaries_ent=None):
+    """ Get size of video stream in KB.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+        videofile_path: Path to video file.
+
+    Returns: Size of stream in KB (1024 B).
+    """
+    return float(video_packet_sizes(videofile_path, binaries_ent).sum()) / 1024
 
 
 def video_dimensions(videofile_path, binaries_ent=None):
@@ -201,45 +460,8 @@ def video_dimensions(videofile_path, binaries_ent=None):
 
     Returns: Dimensions of video in string. e.g. "1920x1080"
     """
-    if binaries_ent is None:
-        global binaries
-        ffprobepath = binaries["ffprobe"]
-    elif type(binaries_ent) == str:
-        ffprobepath = binaries_ent
-    elif type(binaries_ent) == dict:
-        ffprobepath = binaries_ent["ffprobe"]
-    else:
-        raise TypeError(
-            "Passed binary can only be in format string or dictionary")
-
-    global videofiles_resolution
-    try:
-        resolution = videofiles_resolution[videofile_path]
-        return resolution
-    except KeyError:
-        result = subprocess.run(
-            [
-                ffprobepath,
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=width,height",
-                "-of",
-                "csv=s=x:p=0",
-                videofile_path,
-            ],
-            capture_output=True,
-            text=True,
-        )
-        try:
-            resolution_str = str(result.stdout.split("\n")[0])
-            resolution = [int(resolution_str.split("x")[0]), int(resolution_str.split("x")[1])]
-            videofiles_resolution[videofile_path] = resolution_str
-            return resolution_str
-        except ValueError:
-            raise ValueError(result.stderr.rstrip("\n"))
+    return _probed(videofiles_resolution, videofile_path, binaries_ent,
+                   "no video stream dimensions")
 
 
 def video_pix_fmt(videofile_path, binaries_ent=None):
@@ -252,39 +474,8 @@ def video_pix_fmt(videofile_path, binaries_ent=None):
 
     Returns: String with ffmpeg pix_fmt format. (eg. "yuv420p10le")
     """
-    if binaries_ent is None:
-        global binaries
-        ffprobepath = binaries["ffprobe"]
-    elif type(binaries_ent) == str:
-        ffprobepath = binaries_ent
-    elif type(binaries_ent) == dict:
-        ffprobepath = binaries_ent["ffprobe"]
-    else:
-        raise TypeError(
-            "Passed binary can only be in format string or dictionary")
-
-    global videofiles_pix_fmt
-    try:
-        pix_fmt = videofiles_pix_fmt[videofile_path]
-        return pix_fmt
-    except KeyError:
-        result = subprocess.run(
-            [
-                ffprobepath,
-                "-v",
-                "error",
-                "-select_streams",
-                "v:0",
-                "-show_entries",
-                "stream=pix_fmt",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                videofile_path,
-            ],
-            capture_output=True,
-            text=True,
-        )
-        return str(result.stdout.split("\n")[0])
+    return _probed(videofiles_pix_fmt, videofile_path, binaries_ent,
+                   "no video stream pix_fmt")
 
 
 def video_get_info_for_yuv(videofile_path, binaries_ent=None):
@@ -293,31 +484,121 @@ def video_get_info_for_yuv(videofile_path, binaries_ent=None):
             video_pix_fmt(videofile_path, binaries_ent))
 
 
-def pix_fmt_bpp(pix_fmt, binaries_ent=None):
-    if binaries_ent is None:
-        global binaries
-        ffmpegpath = binaries["ffmpeg"]
-    elif type(binaries_ent) == str:
-        ffmpegpath = binaries_ent
-    elif type(binaries_ent) == dict:
-        ffmpegpath = binaries_ent["ffmpeg"]
-    else:
-        raise TypeError(
-            "Passed binary can only be in format string or dictionary")
+def pix_fmt_table(binaries_ent=None):
+    """ Get descriptors of all pixel formats known to ffprobe.
+
+    Table is loaded once per ffprobe binary.
+
+    Args:
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+
+    Returns: Dictionary of Pix_fmt records, key is pix_fmt name.
+    """
+    ffprobepath = _binary_path(binaries_ent, "ffprobe")
+    try:
+        return pix_fmts[ffprobepath]
+    except KeyError:
+        return _load_pix_fmt_table(ffprobepath)
+
 
+@_single_flight
+def _load_pix_fmt_table(ffprobepath):
+    try:
+        return pix_fmts[ffprobepath]
+    except KeyError:
+        pass
     result = subprocess.run(
         [
-            ffmpegpath,
-            "-pix_fmts",
-            "-hide_banner",
+            ffprobepath,
+            "-v",
+            "error",
+            "-show_pixel_formats",
+            "-of",
+            "json",
         ],
         capture_output=True,
         text=True,
     )
-    line = [s for s in result.stdout.split("\n") if pix_fmt+" " in s][0]
-    if line[2] == "H":
+    try:
+        formats = json.loads(result.stdout)["pixel_formats"]
+    except (ValueError, KeyError):
+        raise ValueError(result.stderr.rstrip("\n"))
+    table = {}
+    for f in formats:
+        flags = f.get("flags", {})
+        table[f["name"]] = Pix_fmt(
+            name=f["name"],
+            nb_components=f.get("nb_components", 0),
+            log2_chroma_w=f.get("log2_chroma_w", 0),
+            log2_chroma_h=f.get("log2_chroma_h", 0),
+            bits_per_pixel=f.get("bits_per_pixel", 0),
+            bit_depths=tuple(c["bit_depth"] for c in f.get("components", [])),
+            planar=bool(flags.get("planar")),
+            rgb=bool(flags.get("rgb")),
+            alpha=bool(flags.get("alpha")),
+            big_endian=bool(flags.get("big_endian")),
+            hwaccel=bool(flags.get("hwaccel")),
+            bitstream=bool(flags.get("bitstream")),
+        )
+    pix_fmts[ffprobepath] = table
+    return table
+
+
+def pix_fmt_info(pix_fmt, binaries_ent=None):
+    """ Get descriptor of pixel format.
+
+    Args:
+        pix_fmt: Pixel format in ffmpeg's format. (eg. "yuv420p10le")
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+
+    Returns: Pix_fmt record.
+    """
+    try:
+        return pix_fmt_table(binaries_ent)[pix_fmt]
+    except KeyError:
+        raise ValueError(f"Unknown pix_fmt: {pix_fmt}")
+
+
+def pix_fmt_bpp(pix_fmt, binaries_ent=None):
+    """ Get average bits per pixel of pixel format, -1 for hwaccel formats. """
+    info = pix_fmt_info(pix_fmt, binaries_ent)
+    if info.hwaccel:
         return -1
-    return int(line[-4:].lstrip())
+    return info.bits_per_pixel
+
+
+def raw_frame_size(video_dimensions, pix_fmt, binaries_ent=None):
+    """ Calculate size of one raw frame as written by rawvideo muxer.
+
+    Planar formats are summed plane by plane with rounded up chroma
+    dimensions and samples above 8 bits stored in 2 bytes.
+
+    Args:
+        video_dimensions: Dimensions of video in string. e.g. "1920x1080"
+        pix_fmt: Pixel format in ffmpeg's format. (eg. "yuv420p10le")
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+
+    Returns: Size of frame in bytes.
+    """
+    width, height = (int(d) for d in video_dimensions.split("x"))
+    info = pix_fmt_info(pix_fmt, binaries_ent)
+    if info.hwaccel:
+        raise ValueError(f"Hardware pix_fmt has no raw size: {pix_fmt}")
+    if not info.planar:
+        return -(-width * height * info.bits_per_pixel // 8)
+    chroma_width = -(-width >> info.log2_chroma_w)
+    chroma_height = -(-height >> info.log2_chroma_h)
+    size = 0
+    for i, bit_depth in enumerate(info.bit_depths):
+        # components 1 and 2 are chroma, except for RGB (GBR planes)
+        if i in (1, 2) and not info.rgb:
+            size += chroma_width * chroma_height * -(-bit_depth // 8)
+        else:
+            size += width * height * -(-bit_depth // 8)
+    return size
 
 
 def calculate_size_raw(num_frames, video_dimensions, pix_fmt, binaries_ent=None):
@@ -2,12 +2,14 @@ import os
 import subprocess
 import encoders_comparison_tool as enc
 import video_info
+import yuv_reader
 
 
 OUTPUT_UNSUPORTED_BY_FFMPEG = True
 INPUT_FILE_TYPE = ("yuv")
 OUTPUT_FILE_TYPE = "mkv"
 ENCODED_FILE_TYPE = "266"
+STAGED_FILE_TYPE = "yuv"
 # If the encoder doesn't support the input format, then transcode in
 # encoders_comparison_tool to supported format. If the format is YUV, the
 # function sends back the pix_fmt, framerate and path to transcoded file.
@@ -27,20 +29,20 @@ class bcolors:
 
 
 def _pix_fmt_to_param(pix_fmt):
-    if pix_fmt.startswith("yuv4") and pix_fmt[6] == "p":
-        # VVC support only progressive scan and input file in YUV
-        # InputBitDepth is for --InputBitDepth
-        # ChromaFormat is for --InputChromaFormat
-        # InternalBitDepth is for --InternalBitDepth
-        ChromaFormat = pix_fmt[3:6]
-        if pix_fmt.endswith("p"):
-            InputBitDepth = 8
-        elif pix_fmt.endswith("le"):
-            InputBitDepth = pix_fmt[7:9]
-            if InputBitDepth.endswith("l"):
-                InputBitDepth = pix_fmt[7]
-        InternalBitDepth = InputBitDepth
-        return str(InputBitDepth), str(ChromaFormat), str(InternalBitDepth)
+    # VVC support only progressive scan and input file in planar YUV
+    # InputBitDepth is for --InputBitDepth
+    # ChromaFormat is for --InputChromaFormat
+    # InternalBitDepth is for --InternalBitDepth
+    info = video_info.pix_fmt_info(pix_fmt)
+    chroma_formats = {(1, 1): "420", (1, 0): "422", (0, 0): "444"}
+    subsampling = (info.log2_chroma_w, info.log2_chroma_h)
+    if (not pix_fmt.startswith("yuv") or not info.planar or info.big_endian
+            or info.nb_components != 3 or subsampling not in chroma_formats):
+        raise ValueError(f"vvenc doesn't support pix_fmt: {pix_fmt}")
+    ChromaFormat = chroma_formats[subsampling]
+    InputBitDepth = info.bit_depths[0]
+    InternalBitDepth = InputBitDepth
+    return str(InputBitDepth), str(ChromaFormat), str(InternalBitDepth)
 
 
 # Internal function
@@ -65,7 +67,7 @@ def _encode_cmd(job, inputfile_format, run):
 def _encode(job, inputfile_format, run):
     cmd = _encode_cmd(job, inputfile_format, run)
     process = subprocess.Popen(
-        cmd,
+        enc.job_command(job, cmd),
         text=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
@@ -81,7 +83,7 @@ def _decode_to_null(job):
         nullfile = "NUL"
     cmd = [job.binary[1], "-b", job.encodedfile, "--y4m", "-o", nullfile]
     process = subprocess.Popen(
-        cmd,
+        enc.job_command(job, cmd),
         text=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -93,7 +95,7 @@ def _decode_to_null(job):
 def _decode_to_ffmpeg(job):
     cmd = [job.binary[1], "-b", job.encodedfile, "--y4m", "-o", "-"]
     process_vvdec = subprocess.Popen(
-        cmd,
+        enc.job_command(job, cmd),
         text=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -101,7 +103,7 @@ def _decode_to_ffmpeg(job):
     cmd = [job.binaries["ffmpeg"], "-i", "pipe:0", "-c:v", "ffv1",
            "-y", job.outputfile]
     process_ffmpeg = subprocess.Popen(
-        cmd,
+        enc.job_command(job, cmd),
         text=True,
         stdin=process_vvdec.stdout,
         stdout=subprocess.PIPE,
@@ -119,11 +121,15 @@ def get_input_variant(inputfile):
 # Start transcode
 def transcode_start(job):
     
-    dimensions = video_info.video_dimensions(job.inputfile)
-    fps = video_info.video_framerate_str(job.inputfile)
-    pix_fmt = video_info.video_pix_fmt(job.inputfile)
-    InputBitDepth, ChromaFormat, InternalBitDepth = _pix_fmt_to_param(pix_fmt)
-    inputfile_format = ["-s", dimensions, "--fps", fps,
+    info = video_info.video_get_info(job.inputfile)
+    InputBitDepth, ChromaFormat, InternalBitDepth = _pix_fmt_to_param(info.pix_fmt)
+    with yuv_reader.Yuv_file(job.inputfile_variant, info.dimensions, info.pix_fmt) as variant:
+        if variant.frames == 0:
+            raise ValueError(f"{job.inputfile_variant} has no whole frame of {info.dimensions} {info.pix_fmt}")
+        if (os.path.getsize(job.inputfile_variant) % variant.frame_size) != 0:
+            print(f"{bcolors.WARNING}{job.inputfile_variant} size isn't multiple of frame size, "
+                  f"is it {info.dimensions} {info.pix_fmt}?{bcolors.ENDC}")
+    inputfile_format = ["-s", info.dimensions, "--fps", info.framerate_str,
                         "--InputBitDepth", InputBitDepth,
                         "--InputChromaFormat", ChromaFormat,
                         "--InternalBitDepth", InternalBitDepth]
@@ -152,6 +158,7 @@ def transcode_start(job):
             line = process.stdout.readline().rstrip("\n")
             frame_num = transcode_get_info(job, process, line, frame_num)
         process.wait()
+        job.PID = None
         if (process.returncode > 0):
             raise ValueError(
                 "command: {}\n failed with returncode: {}\nProgram output:\n{}"
@@ -186,12 +193,14 @@ def transcode_start(job):
     if not job.only_decode:
         enc.transcode_status_update_callback(job, ["state", "decoding and compressing"])
         process_vvdec, process_ffmpeg = _decode_to_ffmpeg(job)
+        job.PIDs = [process_vvdec.pid, process_ffmpeg.pid]
         frame_num = 0
         while process_vvdec.poll() is None:
             line = process_vvdec.stderr.readline().rstrip("\n")
             frame_num = transcode_get_info(job, process_vvdec, line, frame_num)
         process_vvdec.wait()
         process_ffmpeg.wait()
+        job.PID = None
         print(process_vvdec.returncode)
         print(process_ffmpeg.returncode)
     job.finished = True
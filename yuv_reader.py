@@ -0,0 +1,234 @@
+""" Memory mapped access to raw YUV and Y4M files.
+
+Geometry of Y4M files is read from their header, raw YUV files need
+dimensions and pix_fmt from caller. Frames are NumPy views into the mapped
+file, nothing is copied until the planes are used in computation.
+
+Usage:
+    with Yuv_file("Sintel.y4m") as video:
+        for y, u, v in video:
+            print(y.mean())
+"""
+import os
+import re
+import numpy as np
+import video_info
+
+
+# Y4M colorspace tags as written by ffmpeg and their pix_fmt.
+Y4M_COLORSPACES = {
+    "420jpeg": "yuv420p",
+    "420mpeg2": "yuv420p",
+    "420paldv": "yuv420p",
+    "420": "yuv420p",
+    "411": "yuv411p",
+    "422": "yuv422p",
+    "444": "yuv444p",
+    "444alpha": "yuva444p",
+    "mono": "gray",
+    "mono9": "gray9le",
+    "mono10": "gray10le",
+    "mono12": "gray12le",
+    "mono16": "gray16le",
+    "420p9": "yuv420p9le",
+    "422p9": "yuv422p9le",
+    "444p9": "yuv444p9le",
+    "420p10": "yuv420p10le",
+    "422p10": "yuv422p10le",
+    "444p10": "yuv444p10le",
+    "420p12": "yuv420p12le",
+    "422p12": "yuv422p12le",
+    "444p12": "yuv444p12le",
+    "420p14": "yuv420p14le",
+    "422p14": "yuv422p14le",
+    "444p14": "yuv444p14le",
+    "420p16": "yuv420p16le",
+    "422p16": "yuv422p16le",
+    "444p16": "yuv444p16le",
+}
+# Layout of Y4M pix_fmts, used when ffprobe isn't available. Y4M files are
+# probed without ffprobe and their formats are fixed by the format.
+_Y4M_LAYOUTS = {
+    "yuv411p": (2, 0, 8, 3),
+    "yuva444p": (0, 0, 8, 4),
+    "gray": (0, 0, 8, 1),
+    **{f"gray{depth}le": (0, 0, depth, 1) for depth in (9, 10, 12, 16)},
+    **{f"yuv{chroma}p{suffix}": (*log2, depth, 3)
+       for chroma, log2 in (("420", (1, 1)), ("422", (1, 0)), ("444", (0, 0)))
+       for suffix, depth in (("", 8), ("9le", 9), ("10le", 10), ("12le", 12), ("14le", 14), ("16le", 16))},
+}
+# ffprobe doesn't show planes of components, formats with interleaved chroma
+# plane are known by name (e.g. nv12, p010le).
+_SEMI_PLANAR_RE = re.compile(r"^(nv\d\d|p\d\d\d)")
+
+
+def pix_fmt_planes(pix_fmt, binaries_ent=None):
+    """ Layout of planar YUV or gray pix_fmt.
+
+    Layout is taken from video_info.pix_fmt_info(), formats of Y4M are known
+    without ffprobe too.
+
+    Args:
+        pix_fmt: Pixel format in ffmpeg's format. (eg. "yuv420p10le")
+        binaries_ent: Dictionary with binaries and their path or string with path
+                  to ffprobe.
+
+    Returns: Tuple (log2_chroma_w, log2_chroma_h, bit_depth, number of planes).
+    """
+    try:
+        info = video_info.pix_fmt_info(pix_fmt, binaries_ent)
+    except OSError:
+        if pix_fmt in _Y4M_LAYOUTS:
+            return _Y4M_LAYOUTS[pix_fmt]
+        raise ValueError(f"Layout of pix_fmt {pix_fmt} unknown, ffprobe isn't available")
+    if (not info.planar or info.rgb or info.big_endian or info.hwaccel or info.bitstream
+            or _SEMI_PLANAR_RE.match(pix_fmt) or info.nb_components not in (1, 3, 4)
+            or len(set(info.bit_depths)) != 1 or info.bit_depths[0] > 16):
+        raise ValueError(f"Unsupported pix_fmt for raw YUV: {pix_fmt}")
+    return info.log2_chroma_w, info.log2_chroma_h, info.bit_depths[0], info.nb_components
+
+
+def parse_y4m_header(line):
+    """ Parse stream header of Y4M file.
+
+    Args:
+        line: First line of file without newline, as string.
+
+    Returns: Dictionary with width, height, framerate_str, pix_fmt,
+        interlace and aspect.
+    """
+    tokens = line.split(" ")
+    if tokens[0] != "YUV4MPEG2":
+        raise ValueError("Not Y4M file")
+    header = {"framerate_str": None, "pix_fmt": "yuv420p", "interlace": "p", "aspect": None}
+    for token in tokens[1:]:
+        if not token:
+            continue
+        tag, value = token[0], token[1:]
+        if tag == "W":
+            header["width"] = int(value)
+        elif tag == "H":
+            header["height"] = int(value)
+        elif tag == "F":
+            header["framerate_str"] = value.replace(":", "/")
+        elif tag == "I":
+            header["interlace"] = value
+        elif tag == "A":
+            header["aspect"] = value.replace(":", "/")
+        elif tag == "C":
+            try:
+                header["pix_fmt"] = Y4M_COLORSPACES[value]
+            except KeyError:
+                raise ValueError(f"Unsupported Y4M colorspace: {value}")
+    if "width" not in header or "height" not in header:
+        raise ValueError("Y4M header without dimensions")
+    return header
+
+
+class Yuv_file:
+    """ Raw YUV or Y4M file mapped to memory.
+
+    Attributes:
+        path: Path to .yuv or .y4m file.
+        dimensions: String "1920x1080", required for raw YUV.
+        pix_fmt: Pixel format in ffmpeg's format, required for raw YUV.
+        framerate_str: Optional for raw YUV, "numerator/denominator".
+
+    Other attributes:
+        width, height, bit_depth: Geometry of frames.
+        frame_size: Size of frame data in bytes.
+        frames: Number of whole frames in file.
+
+    class functions:
+        frame(n): Tuple of plane views of frame n (Y, U, V[, A]), 2D arrays of
+            uint8 or uint16 for more than 8 bits.
+        close(): Unmap the file.
+    """
+
+    def __init__(self, path, dimensions=None, pix_fmt=None, framerate_str=None):
+        self.path = path
+        self.framerate_str = framerate_str
+        self.header_size = 0
+        self.frame_header_size = 0
+        if path.endswith(".y4m"):
+            with open(path, "rb") as f:
+                line = f.readline(4096)
+                frame_line = f.readline(4096)
+            if not line.endswith(b"\n"):
+                raise ValueError(f"{path}: Y4M header is not terminated")
+            header = parse_y4m_header(line[:-1].decode("ascii"))
+            self.width = header["width"]
+            self.height = header["height"]
+            self.pix_fmt = header["pix_fmt"]
+            self.framerate_str = header["framerate_str"]
+            self.interlace = header["interlace"]
+            self.header_size = len(line)
+            # ffmpeg writes bare "FRAME\n", frame parameters would be same for all
+            if frame_line.startswith(b"FRAME"):
+                self.frame_header_size = frame_line.index(b"\n") + 1
+            else:
+                self.frame_header_size = len(b"FRAME\n")
+        else:
+            if dimensions is None or pix_fmt is None:
+                raise ValueError(f"{path}: raw YUV needs dimensions and pix_fmt")
+            self.width, self.height = (int(d) for d in dimensions.split("x"))
+            self.pix_fmt = pix_fmt
+            self.interlace = "p"
+        self.dimensions = f"{self.width}x{self.height}"
+        log2_chroma_w, log2_chroma_h, self.bit_depth, nb_planes = pix_fmt_planes(self.pix_fmt)
+        self.dtype = np.dtype(np.uint8) if self.bit_depth <= 8 else np.dtype("<u2")
+        chroma = (-(-self.height >> log2_chroma_h), -(-self.width >> log2_chroma_w))
+        self.plane_shapes = [(self.height, self.width), chroma, chroma,
+                             (self.height, self.width)][:nb_planes]
+        self.frame_size = sum(h * w for h, w in self.plane_shapes) * self.dtype.itemsize
+        self.frame_stride = self.frame_header_size + self.frame_size
+        self.frames = (os.path.getsize(path) - self.header_size) // self.frame_stride
+        self.data = None
+        if self.frames > 0:
+            self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    @property
+    def framerate(self):
+        if self.framerate_str is None:
+            return None
+        num, den = self.framerate_str.split("/")
+        return int(num) / int(den)
+
+    @property
+    def duration(self):
+        if self.framerate is None:
+            return None
+        return self.frames / self.framerate
+
+    def frame(self, n):
+        if n < 0:
+            n += self.frames
+        if not 0 <= n < self.frames:
+            raise IndexError(f"frame {n} out of range of {self.frames} frames")
+        offset = self.header_size + n * self.frame_stride + self.frame_header_size
+        planes = []
+        for shape in self.plane_shapes:
+            size = shape[0] * shape[1] * self.dtype.itemsize
+            planes.append(self.data[offset:offset + size].view(self.dtype).reshape(shape))
+            offset += size
+        return tuple(planes)
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, n):
+        return self.frame(n)
+
+    def __iter__(self):
+        for n in range(self.frames):
+            yield self.frame(n)
+
+    def close(self):
+        # mapping is released when no frame views are left
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()